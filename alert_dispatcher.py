@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+from collections import deque
+
+class AlertDispatcher:
+    """Background worker that drains the durable SQLite outbox.
+
+    Alerts are written to the `outbox` table before any network call, so
+    pending messages survive crashes and restarts. Each message carries an
+    idempotency key (alert id + recipient), so re-queuing the same alert is a
+    no-op, and a message is marked sent exactly once. Failed sends are
+    rescheduled with jittered exponential backoff until `max_attempts`.
+    Messages not sent within their max age (`max_age` unless enqueued with
+    a shorter one, e.g. live updates) are marked failed instead of sent late.
+    """
+
+    def __init__(self, db, messaging, batch_size=20, poll_interval=1.0, max_attempts=8,
+                 backoff=2.0, max_backoff=300.0, max_age=1800.0):
+        self.db = db
+        self.messaging = messaging
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_age = max_age  # Seconds after queueing that a message is still worth sending
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        self.started_at = None
+        self.stats = {'batches': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'expired': 0}
+        # Queue-to-delivery latency of recently sent messages, in seconds
+        self.latencies = deque(maxlen=1000)
+
+    def start(self):
+        if self.running:
+            return
+        self.db.reset_stale_outbox()
+        self.stats['expired'] += self.db.expire_outbox(time.time())
+        self.running = True
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        print("Alert dispatcher started")
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+        print("Alert dispatcher stopped")
+
+    def enqueue(self, key, to_numbers, body, max_age=None):
+        """Persist one message per recipient under `key` and wake the worker.
+
+        The messages expire `max_age` seconds from now (default `self.max_age`).
+        """
+        numbers = [self.messaging.normalize_number(number) for number in to_numbers]
+        messages = [(f"{key}:{number}", number, body) for number in numbers]
+        now = time.time()
+        queued = self.db.enqueue_messages(messages, now, now + (self.max_age if max_age is None else max_age))
+        self.wakeup.set()
+        return queued
+
+    def _retry_delay(self, attempts):
+        delay = min(self.max_backoff, self.backoff * (2 ** (attempts - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _run(self):
+        while self.running:
+            rows = self.db.claim_outbox(self.batch_size, time.time())
+            if not rows:
+                # Expired messages are never claimed; this records them as failed
+                self.stats['expired'] += self.db.expire_outbox(time.time())
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+                continue
+            self.drain(rows)
+
+    def drain(self, rows):
+        # One attempt per message here; retries are scheduled through the outbox so they persist
+        summary = self.messaging.send_many([(recipient, body) for _, recipient, body, _, _ in rows], retries=0)
+        now = time.time()
+        for (message_id, recipient, _, attempts, created_at), result in zip(rows, summary['results']):
+            if result['ok']:
+                self.db.mark_outbox_sent(message_id, result['sid'], now)
+                self.stats['sent'] += 1
+                self.latencies.append(now - created_at)
+            elif attempts + 1 < self.max_attempts:
+                self.db.mark_outbox_failed(message_id, result['error'], now + self._retry_delay(attempts + 1))
+                self.stats['retried'] += 1
+            else:
+                self.db.mark_outbox_failed(message_id, result['error'])
+                self.stats['failed'] += 1
+                print(f"Giving up on alert to {recipient} after {attempts + 1} attempts: {result['error']}")
+        self.stats['batches'] += 1
+
+    def metrics(self):
+        """Throughput and delivery latency since start, plus the current backlog."""
+        uptime = time.time() - self.started_at if self.started_at else 0.0
+        latencies = sorted(self.latencies)
+        return dict(self.stats,
+                    pending=self.db.count_outbox('pending'),
+                    throughput_per_s=self.stats['sent'] / uptime if uptime else 0.0,
+                    latency_avg_s=sum(latencies) / len(latencies) if latencies else None,
+                    latency_p95_s=latencies[int(0.95 * (len(latencies) - 1))] if latencies else None)
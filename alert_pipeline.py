@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by every pipeline; lookups are short and mostly waiting on I/O
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="alert-prefetch")
+
+
+class Speculation:
+    def __init__(self, user_id, guardians, location):
+        self.user_id = user_id
+        self.guardians = guardians
+        self.location = location
+
+
+class AlertPipeline:
+    """Runs the guardian lookup and location fix alongside scream classification.
+
+    `speculate()` starts both lookups as soon as audio looks interesting;
+    `commit()` sends the alert once the classifier says yes, so the alert
+    latency is the slowest stage rather than the sum of them. `discard()`
+    cancels lookups that have not started and ignores the rest.
+    """
+
+    def __init__(self, db, location, messaging, main_screen=None, extra_numbers=()):
+        self.db = db
+        self.location = location
+        self.messaging = messaging
+        self.main_screen = main_screen
+        self.extra_numbers = list(extra_numbers)
+
+    def speculate(self, user_id):
+        return Speculation(user_id,
+                           _executor.submit(self.db.get_guardians, user_id),
+                           _executor.submit(self._locate))
+
+    def _locate(self):
+        return self.location.get_location(max_age=self.location.alert_max_age) or self.location.get_last_location()
+
+    def discard(self, speculation):
+        speculation.guardians.cancel()
+        speculation.location.cancel()
+
+    def commit(self, speculation):
+        try:
+            guardians = speculation.guardians.result()
+            if not guardians:
+                self.discard(speculation)
+                print(f"No guardians found for user_id {speculation.user_id}")
+                return None
+            numbers_to_alert = [g[1] for g in guardians] + self.extra_numbers
+            location = speculation.location.result()
+            # Make sure the fixes leading up to the emergency are on disk
+            self.db.flush_locations()
+            print(f"Sending alert to: {numbers_to_alert}, Location: {location}")
+            return self.messaging.send_emergency_alert(numbers_to_alert, location, self.location, self.main_screen)
+        except Exception as e:
+            print(f"Failed to send alert: {e}")
+            return None
+
+    def send(self, user_id):
+        return self.commit(self.speculate(user_id))
@@ -0,0 +1,32 @@
+import wave
+import threading
+import numpy as np
+
+def write_wav(filename, raw, channels, sample_width, rate):
+    wf = wave.open(filename, 'wb')
+    wf.setnchannels(channels)
+    wf.setsampwidth(sample_width)
+    wf.setframerate(rate)
+    wf.writeframes(raw)
+    wf.close()
+
+def read_wav(filename):
+    """Samples of a 16-bit PCM WAV (first channel if stereo) and its sample rate."""
+    with wave.open(filename, 'rb') as wf:
+        channels = wf.getnchannels()
+        rate = wf.getframerate()
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    return samples[::channels], rate
+
+def archive_wav(filename, raw, channels, sample_width, rate):
+    """Write captured audio to disk in the background so evidence archiving never delays an alert."""
+    def _write():
+        try:
+            write_wav(filename, raw, channels, sample_width, rate)
+            print(f"Audio archived: {filename}")
+        except Exception as e:
+            print(f"Error saving audio file {filename}: {e}")
+    thread = threading.Thread(target=_write)
+    thread.daemon = True
+    thread.start()
+    return thread
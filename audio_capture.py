@@ -0,0 +1,127 @@
+import threading
+import time
+import numpy as np
+import pyaudio
+from backend.ring_buffer import RingBuffer
+
+class AudioCapture:
+    """Dedicated microphone producer writing into a preallocated ring.
+
+    PyAudio delivers chunks on its own callback thread, which only copies them
+    into the ring, advances the write index and notifies waiting readers if
+    it can without blocking, so a slow consumer can never stall the device.
+    Each consumer reads through its own AudioReader cursor without copies; a
+    consumer that falls more than a ring behind loses the oldest audio and
+    counts an overrun.
+    """
+
+    def __init__(self, rate=44100, chunk=1024, channels=1, format=pyaudio.paInt16, buffer_seconds=10):
+        self.RATE = rate
+        self.CHUNK = chunk
+        self.CHANNELS = channels
+        self.FORMAT = format
+        # Whole chunks only, so chunk-sized reads never straddle the wrap point
+        n_chunks = max(2, int(rate * buffer_seconds) // chunk)
+        self.ring = RingBuffer(n_chunks * chunk * channels, dtype=np.int16)
+        self.data_ready = threading.Condition()
+        # Readers re-check this often even without a notify, since the callback may skip one
+        self.poll_interval = chunk / rate
+        # 'waits' counts reads that blocked for audio, normal for a live consumer; 'underruns' only
+        # those that timed out while capture was running, i.e. the device stalled
+        self.stats = {'chunks': 0, 'device_overflows': 0, 'overruns': 0, 'waits': 0, 'underruns': 0}
+        self.p = None
+        self.stream = None
+        self.running = False
+        self.start_position = 0  # ring.written when capture last started; older audio is from a previous session
+
+    @property
+    def sample_width(self):
+        return pyaudio.get_sample_size(self.FORMAT)
+
+    def start(self):
+        if self.running:
+            return
+        self.start_position = self.ring.written
+        self.p = pyaudio.PyAudio()
+        # Opened stopped: a callback before `running` is set would end the stream with paComplete
+        self.stream = self.p.open(format=self.FORMAT, channels=self.CHANNELS, rate=self.RATE, input=True,
+                                  frames_per_buffer=self.CHUNK, stream_callback=self._on_audio, start=False)
+        self.running = True
+        self.stream.start_stream()
+        print("Audio capture started")
+
+    def stop(self):
+        self.running = False
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.p:
+            self.p.terminate()
+            self.p = None
+        with self.data_ready:
+            self.data_ready.notify_all()
+        print(f"Audio capture stopped: {self.stats}")
+
+    def _on_audio(self, in_data, frame_count, time_info, status_flags):
+        if status_flags & pyaudio.paInputOverflow:
+            # The device dropped samples before we even saw them
+            self.stats['device_overflows'] += 1
+        self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        self.stats['chunks'] += 1
+        # Never block the device callback: if a reader holds the lock, skip the notify and
+        # let it see the data on its next poll_interval re-check
+        if self.data_ready.acquire(blocking=False):
+            try:
+                self.data_ready.notify_all()
+            finally:
+                self.data_ready.release()
+        return (None, pyaudio.paContinue if self.running else pyaudio.paComplete)
+
+    def reader(self, from_start=False):
+        """New consumer cursor, starting at the live edge (or the oldest audio buffered this session)."""
+        oldest = max(self.ring.written - len(self.ring), self.start_position)
+        return AudioReader(self, oldest if from_start else self.ring.written)
+
+
+class AudioReader:
+    def __init__(self, capture, position):
+        self.capture = capture
+        self.position = position
+
+    def available(self):
+        return self.capture.ring.written - self.position
+
+    def read(self, n, timeout=1.0):
+        """Return the next ``n`` samples as a read-only view, or None if capture stopped or timed out.
+
+        The view aliases the ring, so consume (or copy) it before the producer
+        laps it, i.e. within ``buffer_seconds``.
+        """
+        capture = self.capture
+        ring = capture.ring
+        if self.available() < n:
+            capture.stats['waits'] += 1
+            deadline = time.monotonic() + timeout
+            with capture.data_ready:
+                while self.available() < n and capture.running:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        capture.stats['underruns'] += 1
+                        return None
+                    capture.data_ready.wait(min(remaining, capture.poll_interval))
+            if self.available() < n:
+                return None
+        if self.available() > ring.capacity - capture.CHUNK:
+            # Consumer fell a whole ring behind: skip to the oldest audio the producer won't overwrite next
+            capture.stats['overruns'] += 1
+            self.position = ring.written - ring.capacity + 2 * capture.CHUNK
+        view = ring.read(self.position, n)
+        view.flags.writeable = False
+        self.position += n
+        return view
+
+    def recent(self, n):
+        """Up to ``n`` samples before this reader's position, captured since the last start (a view unless it wraps)."""
+        n = max(0, min(n, len(self.capture.ring), self.position - self.capture.start_position))
+        return self.capture.ring.read(self.position - n, n)
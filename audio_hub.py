@@ -0,0 +1,123 @@
+import threading
+import pyaudio
+from backend.audio_capture import AudioCapture, AudioReader
+
+POLICIES = ('lossless', 'skip', 'latest')
+
+class AudioHub:
+    """Owns the app's one microphone stream and shares it between all consumers.
+
+    A single AudioCapture writes into a shared ring, and every subscriber
+    (scream monitor, keyword spotter, recorders) reads it through its own
+    cursor as read-only views of the ring, so there are no per-consumer
+    copies or queues. The device opens with the first subscriber and closes
+    with the last. Each subscriber picks what happens when it falls behind:
+
+      - 'lossless': every sample, until the ring laps it (recorders)
+      - 'skip':     more than `max_lag` seconds behind, jump to the live edge
+                    minus `max_lag` and count what was dropped (detectors)
+      - 'latest':   every read returns the newest samples, nothing queues
+    """
+
+    def __init__(self, rate=44100, chunk=1024, channels=1, format=pyaudio.paInt16, buffer_seconds=15):
+        self.RATE = rate
+        self.CHUNK = chunk
+        self.CHANNELS = channels
+        self.capture = AudioCapture(rate, chunk, channels, format, buffer_seconds)
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    @property
+    def sample_width(self):
+        return self.capture.sample_width
+
+    def subscribe(self, name, policy='lossless', max_lag=1.0, pre_roll=0.0):
+        """New subscriber starting at the live edge, or `pre_roll` seconds before it.
+
+        The ring always holds the last few seconds while anyone is subscribed,
+        so a triggered recorder can start before its trigger. close() the
+        subscription (or use `with`) when done.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy {policy!r}, expected one of {POLICIES}")
+        with self.lock:
+            subscription = Subscription(self, name, policy, max_lag)
+            self.subscribers.append(subscription)
+            if not self.capture.running:
+                try:
+                    self.capture.start()
+                except Exception:
+                    self.subscribers.remove(subscription)
+                    raise
+            # The cursor starts where capture is now, even if the device just opened; pre-roll never
+            # reaches back past the last start, where the ring still holds an earlier session
+            ring = self.capture.ring
+            available = min(len(ring), ring.written - self.capture.start_position)
+            subscription.position = ring.written - min(int(pre_roll * self.RATE) * self.CHANNELS, available)
+        print(f"Audio hub: '{name}' subscribed ({policy}), {len(self.subscribers)} active")
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription not in self.subscribers:
+                return
+            self.subscribers.remove(subscription)
+            if not self.subscribers:
+                self.capture.stop()
+        print(f"Audio hub: '{subscription.name}' unsubscribed, stats {subscription.stats}")
+
+    def stats(self):
+        with self.lock:
+            return {'capture': dict(self.capture.stats),
+                    'subscribers': {s.name: dict(s.stats, lag=s.available()) for s in self.subscribers}}
+
+
+class Subscription(AudioReader):
+    def __init__(self, hub, name, policy, max_lag):
+        super().__init__(hub.capture, hub.capture.ring.written)
+        self.hub = hub
+        self.name = name
+        self.policy = policy
+        self.max_lag_samples = int(max_lag * hub.RATE) * hub.CHANNELS
+        self.stats = {'reads': 0, 'samples': 0, 'dropped': 0}
+
+    def read(self, n, timeout=1.0):
+        """Next ``n`` samples as a read-only view of the ring, after applying the backpressure policy."""
+        if self.policy == 'skip' and self.available() > self.max_lag_samples + n:
+            self._drop(self.available() - self.max_lag_samples)
+        elif self.policy == 'latest' and self.available() > n:
+            self._drop(self.available() - n)
+        view = super().read(n, timeout)
+        if view is not None:
+            self.stats['reads'] += 1
+            self.stats['samples'] += n
+        return view
+
+    def seek_live(self):
+        """Drop everything not yet read, e.g. after a pause, so the next read is live audio."""
+        self._drop(self.available())
+
+    def _drop(self, n):
+        self.position += n
+        self.stats['dropped'] += n
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_hub = None
+_lock = threading.Lock()
+
+def get_audio_hub():
+    """The process-wide hub; every microphone consumer should subscribe here."""
+    global _hub
+    with _lock:
+        if _hub is None:
+            _hub = AudioHub()
+    return _hub
@@ -1,14 +1,18 @@
 import pyaudio
 import numpy as np
-import wave
 from backend.scream_detector import ScreamDetector
 from backend.messaging_service import MessagingService
 from backend.location_service import LocationService
+from backend.audio_archive import archive_wav
+from backend.audio_hub import get_audio_hub
+from backend.streaming_mfcc import StreamingMFCC
+from backend.prefilter import PreFilterCascade
+from backend.alert_pipeline import AlertPipeline
 import time
 import threading
 
 class AudioMonitor:
-    def __init__(self, user_id, db, main_screen=None):
+    def __init__(self, user_id, db, main_screen=None, continuous=False, scheduler=None, messaging=None, hub=None):
         self.user_id = user_id
         self.db = db
         self.main_screen = main_screen
@@ -17,9 +21,28 @@ class AudioMonitor:
         self.CHANNELS = 1
         self.RATE = 44100
         self.GAIN = 5.0
+        # Triggered captures start this far before the trigger, so the onset is never lost
+        self.PRE_ROLL_SECONDS = 1.5
+        # The CNN was trained on 5 s clips; pre-roll counts towards them, so less is recorded after the trigger
+        self.ANALYSIS_SECONDS = 5
+        self.RECORD_SECONDS = self.ANALYSIS_SECONDS - self.PRE_ROLL_SECONDS
+        # The microphone is shared with the keyword spotter and recorders through the hub
+        self.hub = hub or get_audio_hub()
         self.detector = ScreamDetector()
-        self.messaging = MessagingService()
+        # Cheap gate in front of the CNN; energy only until the spectral/linear stages are fitted
+        self.prefilter = PreFilterCascade(sr=self.RATE)
+        self.messaging = messaging or MessagingService()
         self.location = LocationService(self.db, self.user_id)
+        self.alerts = AlertPipeline(self.db, self.location, self.messaging, self.main_screen)
+        self.archive_recordings = True  # Keep a WAV copy of each capture as evidence
+        # Continuous mode scores a sliding window instead of recording after a loud chunk
+        self.continuous = continuous
+        self.WINDOW_SECONDS = 5
+        self.HOP_SECONDS = 1
+        self.ALERT_COOLDOWN = 30  # Seconds before another continuous-mode alert may fire
+        self.last_alert_time = 0
+        # Optional shared InferenceScheduler that batches windows across monitors
+        self.scheduler = scheduler
         self.running = False
         self.thread = None
 
@@ -28,7 +51,8 @@ class AudioMonitor:
             print("Monitoring already running")
             return
         self.running = True
-        self.thread = threading.Thread(target=self._monitor_audio)
+        target = self._monitor_continuous if self.continuous else self._monitor_audio
+        self.thread = threading.Thread(target=target)
         self.thread.daemon = True
         self.thread.start()
         print(f"Audio monitoring started for user_id {self.user_id}")
@@ -41,62 +65,122 @@ class AudioMonitor:
 
     def _monitor_audio(self):
         try:
-            p = pyaudio.PyAudio()
-            stream = p.open(format=self.FORMAT, channels=self.CHANNELS, rate=self.RATE, input=True, frames_per_buffer=self.CHUNK)
-            print("Monitoring audio in background... Scream loudly to test!")
-            while self.running:
-                data = stream.read(self.CHUNK, exception_on_overflow=False)
-                audio_data = np.frombuffer(data, dtype=np.int16) * self.GAIN
-                if self.check_command(audio_data):
-                    self.record_and_analyze(stream, p)
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
+            # A detector that falls behind skips ahead rather than alerting late
+            with self.hub.subscribe('scream-monitor', policy='skip', max_lag=1.0) as reader:
+                print("Monitoring audio in background... Scream loudly to test!")
+                while self.running:
+                    chunk = reader.read(self.CHUNK)
+                    if chunk is None:
+                        continue
+                    audio_data = chunk * self.GAIN
+                    if self.check_command(audio_data):
+                        # Guardians and location are fetched while the clip records and is classified
+                        self.record_and_analyze(reader, self.alerts.speculate(self.user_id))
         except Exception as e:
             print(f"Error in audio monitoring: {e}")
             self.running = False
 
+    def _monitor_continuous(self):
+        try:
+            with self.hub.subscribe('scream-monitor', policy='skip', max_lag=self.HOP_SECONDS) as reader:
+                features = StreamingMFCC(self.detector.features, max_seconds=self.WINDOW_SECONDS + self.HOP_SECONDS)
+                window_frames = features.frames_for_seconds(self.WINDOW_SECONDS)
+                window_samples = self.WINDOW_SECONDS * self.RATE
+                hop_frames = features.frames_for_seconds(self.HOP_SECONDS) - 1
+                frames_since_score = 0
+                hop_active = False
+                sample_width = self.hub.sample_width
+                print(f"Continuous monitoring: {self.WINDOW_SECONDS}s window, {self.HOP_SECONDS}s hop")
+                while self.running:
+                    chunk = reader.read(self.CHUNK)
+                    if chunk is None:
+                        continue
+                    frames_since_score += features.push(chunk)
+                    hop_active = self.check_command(chunk * self.GAIN) or hop_active
+                    if features.frames_available < window_frames or frames_since_score < hop_frames:
+                        continue
+                    frames_since_score = 0
+                    if not hop_active:
+                        # Nothing in this hop got past the prefilter, so the CNN is skipped
+                        continue
+                    hop_active = False
+                    mfcc = features.window_mfcc(window_frames)
+                    in_cooldown = time.time() - self.last_alert_time <= self.ALERT_COOLDOWN
+                    speculation = None if in_cooldown else self.alerts.speculate(self.user_id)
+                    if self.scheduler:
+                        # Copy the audio now; the ring moves on before the batch returns
+                        window = reader.recent(window_samples).copy()
+                        future = self.scheduler.submit(self.user_id, self.detector.model_input(mfcc),
+                                                       lambda user_id, probability, window=window, speculation=speculation:
+                                                           self._on_window_scored(probability, window, sample_width, speculation))
+                        if speculation is not None:
+                            # A failed batch never calls back, so release the prefetch here instead
+                            future.add_done_callback(lambda f, speculation=speculation:
+                                                     f.exception() and self.alerts.discard(speculation))
+                    else:
+                        self._on_window_scored(self.detector.predict_mfcc(mfcc), reader.recent(window_samples), sample_width, speculation)
+        except Exception as e:
+            print(f"Error in continuous audio monitoring: {e}")
+            self.running = False
+
+    def capture_stats(self):
+        """Device overflows, ring overruns/underruns and per-subscriber drops, to spot analysis falling behind."""
+        return self.hub.stats()
+
+    def _on_window_scored(self, probability, window, sample_width, speculation):
+        if speculation is None:
+            return
+        if not self.detector.is_scream(probability) or time.time() - self.last_alert_time <= self.ALERT_COOLDOWN:
+            self.alerts.discard(speculation)
+            return
+        self.last_alert_time = time.time()
+        print(f"Scream detected in sliding window: probability={probability:.4f}")
+        # Alert off the capture thread so the next hop is still heard
+        threading.Thread(target=self._handle_scream, args=(window.copy(), sample_width, speculation), daemon=True).start()
+
+    def _handle_scream(self, window, sample_width, speculation):
+        source = f"emergency_{self.user_id}_{int(time.time())}"
+        if self.archive_recordings:
+            archive_wav(f"data/{source}.wav", window.tobytes(), self.CHANNELS, sample_width, self.RATE)
+        self.alerts.commit(speculation)
+
     def check_command(self, audio_data):
-        max_amplitude = np.max(np.abs(audio_data))
-        is_loud = max_amplitude > 50
-        print(f"Audio check: max amplitude={max_amplitude}, loud={is_loud}")
-        return is_loud
+        return self.prefilter.check(audio_data)
 
-    def record_and_analyze(self, stream, p):
-        frames = []
-        RECORD_SECONDS = 5
-        print(f"Recording {RECORD_SECONDS} seconds of audio...")
-        for _ in range(0, int(self.RATE / self.CHUNK * RECORD_SECONDS)):
-            if not self.running:
+    def record_and_analyze(self, reader, speculation=None):
+        print(f"Recording {self.RECORD_SECONDS} seconds of audio after {self.PRE_ROLL_SECONDS}s of pre-roll...")
+        # The audio just before the trigger is still in the hub's ring
+        pre_roll = reader.recent(int(self.PRE_ROLL_SECONDS * self.RATE))
+        # Always a full analysis window, even if less pre-roll was buffered than asked for
+        samples = np.zeros(int(self.RATE / self.CHUNK * self.ANALYSIS_SECONDS) * self.CHUNK, dtype=np.int16)
+        samples[:len(pre_roll)] = pre_roll
+        recorded = len(pre_roll)
+        while recorded < len(samples) and self.running:
+            chunk = reader.read(self.CHUNK)
+            if chunk is None:
                 break
-            data = stream.read(self.CHUNK, exception_on_overflow=False)
-            frames.append(data)
-        filename = f"data/emergency_{self.user_id}_{int(time.time())}.wav"
+            n = min(self.CHUNK, len(samples) - recorded)
+            samples[recorded:recorded + n] = chunk[:n]
+            recorded += n
+        samples = samples[:recorded]
+        source = f"emergency_{self.user_id}_{int(time.time())}"
+        speculation = speculation or self.alerts.speculate(self.user_id)
+
         try:
-            wf = wave.open(filename, 'wb')
-            wf.setnchannels(self.CHANNELS)
-            wf.setsampwidth(p.get_sample_size(self.FORMAT))
-            wf.setframerate(self.RATE)
-            wf.writeframes(b''.join(frames))
-            wf.close()
-            print(f"Audio recorded: {filename}")
+            is_scream = self.detector.analyze_samples(samples, self.RATE, source=source)
         except Exception as e:
-            print(f"Error saving audio file {filename}: {e}")
+            print(f"Error processing scream detection: {e}")
+            self.alerts.discard(speculation)
             return
+        if self.archive_recordings:
+            archive_wav(f"data/{source}.wav", samples.tobytes(), self.CHANNELS, self.hub.sample_width, self.RATE)
 
         try:
-            if self.detector.analyze_audio(filename):
-                print(f"Scream detected in {filename}")
-                guardians = self.db.get_guardians(self.user_id)
-                if not guardians:
-                    print(f"No guardians found for user_id {self.user_id}")
-                    return
-                guardian_numbers = [g[1] for g in guardians]
-                location = self.location.get_location() or self.location.get_last_location()
-                numbers_to_alert = guardian_numbers
-                print(f"Sending alert to: {numbers_to_alert}, Location: {location}")
-                self.messaging.send_emergency_alert(numbers_to_alert, location, self.location, self.main_screen)
+            if is_scream:
+                print(f"Scream detected in {source}")
+                self.alerts.commit(speculation)
             else:
-                print(f"No scream detected in {filename}")
+                print(f"No scream detected in {source}")
+                self.alerts.discard(speculation)
         except Exception as e:
-            print(f"Error processing scream detection or alert: {e}")
\ No newline at end of file
+            print(f"Error processing scream detection or alert: {e}")
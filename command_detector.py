@@ -2,29 +2,55 @@ import pyaudio
 import numpy as np
 import threading
 import time
-import speech_recognition as sr
-import wave
 from backend.location_service import LocationService
 from backend.scream_detector import ScreamDetector
+from backend.audio_archive import archive_wav
+from backend.alert_pipeline import AlertPipeline
+from backend.audio_hub import get_audio_hub
+from backend.keyword_spotter import load_user_spotter
+from backend.template_matcher import load_templates
+
+def prepare_command_models(db, user_id):
+    """Build the user's templates and train their keyword model, off the UI thread at enrollment and login."""
+    try:
+        load_templates(db, user_id)
+        load_user_spotter(db, user_id)
+    except Exception as e:
+        print(f"Error preparing command models for user_id {user_id}: {e}")
+
 
 class CommandDetector:
-    def __init__(self, messaging_service, db, user_id, main_screen=None):
+    def __init__(self, messaging_service, db, user_id, main_screen=None, hub=None, location=None):
         self.messaging_service = messaging_service
         self.db = db
         self.user_id = user_id
         self.main_screen = main_screen
-        self.location = LocationService(self.db, self.user_id)
+        # Shared with the scream monitor, so both alert paths drive the same live sharing
+        self.location = location or LocationService(self.db, self.user_id)
+        self.alerts = AlertPipeline(self.db, self.location, self.messaging_service, self.main_screen, ['+91100'])
         self.detector = ScreamDetector()
         self.running = False
         self.thread = None
-        self.keyword = "help"
-        self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
         self.CHUNK = 1024
         self.FORMAT = pyaudio.paInt16
         self.CHANNELS = 1
         self.RATE = 44100
-        self.RECORD_SECONDS = 5
+        # Recordings start before the keyword fired; the CNN still gets the 5 s clips it was trained on
+        self.PRE_ROLL_SECONDS = 1.0
+        self.ANALYSIS_SECONDS = 5
+        self.RECORD_SECONDS = self.ANALYSIS_SECONDS - self.PRE_ROLL_SECONDS
+        # The trigger phrase is spotted on-device from the user's own recordings, no network round trip
+        self.spotter = None
+        self.templates = None
+        # Without a trained spotter, DTW template matching every FALLBACK_HOP_SECONDS stands in,
+        # and the trained model is picked up once enrollment or login has built it
+        self.FALLBACK_HOP_SECONDS = 0.25
+        self.MODEL_CHECK_SECONDS = 30
+        self.fallback_samples = 0
+        self.next_model_check = 0
+        self.status = None  # 'keyword', 'templates' (fallback) or 'disabled'
+        # Same microphone stream as the scream monitor, via the shared hub
+        self.hub = hub or get_audio_hub()
 
     def start_listening(self):
         if self.running:
@@ -42,76 +68,122 @@ class CommandDetector:
             self.thread.join(timeout=1)
         print("Command detection stopped")
 
+    def _load_models(self):
+        """Pick up whichever of the user's models are ready; never trains, that happens at enrollment and login."""
+        try:
+            if self.spotter is None:
+                self.spotter = load_user_spotter(self.db, self.user_id, train=False)
+            if self.templates is None:
+                self.templates = load_templates(self.db, self.user_id)
+        except Exception as e:
+            print(f"Error loading command models: {e}")
+        if self.spotter is not None:
+            self._set_status('keyword', "Voice trigger ready")
+        elif self.templates is not None:
+            self._set_status('templates', "Voice trigger: matching your recordings until the keyword model is trained")
+        else:
+            self._set_status('disabled', "Voice trigger off: record your trigger phrase first")
+        self.next_model_check = time.monotonic() + self.MODEL_CHECK_SECONDS
+
+    def _set_status(self, status, message):
+        if status == self.status:
+            return
+        self.status = status
+        print(f"Command detection: {message}")
+        if self.main_screen:
+            self.main_screen.show_command_status(message)
+
     def _listen_for_command(self):
-        with self.microphone as source:
-            self.recognizer.adjust_for_ambient_noise(source)
-            print("Listening for command...")
-            while self.running:
-                try:
-                    audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=5)
-                    command = self.recognizer.recognize_google(audio)
-                    print(f"Heard command: {command}")
-                    if self.keyword.lower() in command.lower():
-                        print(f"Keyword '{self.keyword}' detected! Recording 5 seconds of audio...")
-                        audio_file = self.record_audio()
-                        if audio_file and self.detector.analyze_audio(audio_file):
-                            print(f"Scream detected in {audio_file}! Sending emergency alert...")
-                            self.send_emergency_alert()
-                        else:
-                            print(f"No scream detected in {audio_file}")
+        self._load_models()
+        if self.status == 'disabled':
+            self.running = False
+            return
+        try:
+            # Keyword latency matters more than completeness, so a lagging spotter skips ahead
+            with self.hub.subscribe('keyword-spotter', policy='skip', max_lag=0.5) as reader:
+                print("Listening for command...")
+                while self.running:
+                    chunk = reader.read(self.CHUNK)
+                    if chunk is None:
+                        continue
+                    if self._heard_keyword(reader, chunk):
+                        self._on_keyword(reader)
                         time.sleep(10)
-                except sr.WaitTimeoutError:
-                    continue
-                except sr.UnknownValueError:
-                    print("Didn't understand audio")
-                    continue
-                except Exception as e:
-                    print(f"Error in listening: {e}")
-                    continue
+                        # Start fresh at the live edge rather than scoring audio from the cooldown
+                        reader.seek_live()
+                        if self.spotter is not None:
+                            self.spotter.reset()
+        except Exception as e:
+            print(f"Error in listening: {e}")
+        finally:
+            if self.spotter is not None:
+                print(f"Keyword spotting: {self.spotter.stats['hops']} hops, "
+                      f"{self.spotter.mean_score_ms():.2f}ms per hop")
+
+    def _heard_keyword(self, reader, chunk):
+        if self.spotter is not None:
+            return self.spotter.detect(chunk)
+        # Fallback until the keyword model exists: DTW against the user's recordings every hop
+        self.fallback_samples += len(chunk)
+        if self.fallback_samples < self.FALLBACK_HOP_SECONDS * self.RATE:
+            return False
+        self.fallback_samples = 0
+        if time.monotonic() >= self.next_model_check:
+            self._load_models()
+            if self.spotter is not None:
+                reader.seek_live()
+                return False
+        heard = reader.recent(int((self.templates.max_seconds + 0.5) * self.RATE))
+        if np.max(np.abs(heard)) < 20:
+            return False  # Silence; not worth a DTW pass
+        return self.templates.distance(heard) <= self.templates.threshold
+
+    def _on_keyword(self, reader):
+        speculation = self.alerts.speculate(self.user_id)
+        if self.templates is not None:
+            # The phrase just heard, plus some slack for where the spotter fired
+            heard = reader.recent(int((self.templates.max_seconds + 1.0) * self.RATE)).copy()
+            if self.templates.matches(heard):
+                # The user's own trigger phrase is enough; no need to wait for a scream
+                print("Trigger phrase matches the user's recordings! Sending emergency alert...")
+                self.alerts.commit(speculation)
+                archive_wav(f"data/command_{self.user_id}_{int(time.time())}.wav", heard.tobytes(),
+                            self.CHANNELS, self.hub.sample_width, self.RATE)
+                return
+        print("Keyword detected! Recording audio...")
+        samples = self.record_audio()
+        if samples is not None and self.detector.analyze_samples(samples, self.RATE, source="command"):
+            print("Scream detected in command recording! Sending emergency alert...")
+            self.alerts.commit(speculation)
+        else:
+            print("No scream detected in command recording")
+            self.alerts.discard(speculation)
 
     def record_audio(self):
         try:
-            p = pyaudio.PyAudio()
-            stream = p.open(format=self.FORMAT, channels=self.CHANNELS,
-                            rate=self.RATE, input=True, frames_per_buffer=self.CHUNK)
-            print(f"Recording {self.RECORD_SECONDS} seconds of audio...")
-            frames = []
-            for _ in range(0, int(self.RATE / self.CHUNK * self.RECORD_SECONDS)):
-                if not self.running:
-                    break
-                data = stream.read(self.CHUNK, exception_on_overflow=False)
-                frames.append(data)
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
-            audio_data = np.frombuffer(b''.join(frames), dtype=np.int16)
-            max_amplitude = np.max(np.abs(audio_data))
+            # Its own lossless subscription on the shared stream, so no device is opened per trigger
+            with self.hub.subscribe('command-recorder', pre_roll=self.PRE_ROLL_SECONDS) as recorder:
+                print(f"Recording {self.RECORD_SECONDS} seconds of audio after {self.PRE_ROLL_SECONDS}s of pre-roll...")
+                audio_data = np.zeros(int(self.RATE / self.CHUNK * self.ANALYSIS_SECONDS) * self.CHUNK, dtype=np.int16)
+                recorded = 0
+                while recorded < len(audio_data) and self.running:
+                    chunk = recorder.read(self.CHUNK)
+                    if chunk is None:
+                        break
+                    audio_data[recorded:recorded + self.CHUNK] = chunk
+                    recorded += self.CHUNK
+            audio_data = audio_data[:recorded]
+            max_amplitude = np.max(np.abs(audio_data)) if recorded else 0
             if max_amplitude < 20:
                 print(f"Audio too quiet: max amplitude={max_amplitude}")
                 return None
             filename = f"data/command_{self.user_id}_{int(time.time())}.wav"
-            wf = wave.open(filename, 'wb')
-            wf.setnchannels(self.CHANNELS)
-            wf.setsampwidth(p.get_sample_size(self.FORMAT))
-            wf.setframerate(self.RATE)
-            wf.writeframes(b''.join(frames))
-            wf.close()
+            archive_wav(filename, audio_data.tobytes(), self.CHANNELS, self.hub.sample_width, self.RATE)
             print(f"Audio recorded: {filename}, max amplitude={max_amplitude}")
-            return filename
+            return audio_data
         except Exception as e:
             print(f"Error recording audio: {e}")
             return None
 
     def send_emergency_alert(self):
-        try:
-            guardians = self.db.get_guardians(self.user_id)
-            if not guardians:
-                print(f"No guardians found for user_id {self.user_id}")
-                return
-            guardian_numbers = [g[1] for g in guardians]
-            location = self.location.get_location() or self.location.get_last_location()
-            numbers_to_alert = guardian_numbers + ['+91100']
-            print(f"Sending alert to: {numbers_to_alert}, Location: {location}")
-            self.messaging_service.send_emergency_alert(numbers_to_alert, location, self.location, self.main_screen)
-        except Exception as e:
-            print(f"Failed to send alert: {e}")
\ No newline at end of file
+        self.alerts.send(self.user_id)
@@ -1,31 +1,194 @@
 import sqlite3
 import threading
+import weakref
+
+DB_PATH = 'data/database.db'
+
+# Applied to every connection; WAL lets readers run while the writer commits
+PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',  # Durable across app crashes in WAL mode, fsyncs only at checkpoints
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-8000',  # 8 MB page cache per connection
+    'PRAGMA mmap_size=67108864',
+)
+
+# Schema migrations; MIGRATIONS[i] upgrades a database from user_version i to i + 1.
+# Only ever append: released databases have already run the earlier entries.
+MIGRATIONS = [
+    # 1: original schema
+    (
+        '''CREATE TABLE IF NOT EXISTS users 
+           (id INTEGER PRIMARY KEY, name TEXT, mobile TEXT UNIQUE, 
+           password TEXT, gender TEXT, dob TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS guardians 
+           (id INTEGER PRIMARY KEY, user_id INTEGER, name TEXT, number TEXT,
+           FOREIGN KEY(user_id) REFERENCES users(id))''',
+        '''CREATE TABLE IF NOT EXISTS commands 
+           (id INTEGER PRIMARY KEY, user_id INTEGER, command_text TEXT, audio_file TEXT,
+           FOREIGN KEY(user_id) REFERENCES users(id))''',
+        '''CREATE TABLE IF NOT EXISTS locations 
+           (id INTEGER PRIMARY KEY, user_id INTEGER, latitude REAL, longitude REAL, timestamp TEXT,
+           FOREIGN KEY(user_id) REFERENCES users(id))''',
+        '''CREATE TABLE IF NOT EXISTS outbox 
+           (id INTEGER PRIMARY KEY, idempotency_key TEXT UNIQUE, recipient TEXT, body TEXT,
+           status TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0, next_attempt_at REAL,
+           created_at REAL, sent_at REAL, sid TEXT, last_error TEXT)''',
+        '''CREATE INDEX IF NOT EXISTS idx_outbox_pending 
+           ON outbox (status, next_attempt_at)''',
+    ),
+    # 2: location timestamps become integer epoch seconds. SQLite cannot change a
+    # column type, so the table is rebuilt; old 'YYYY-MM-DD HH:MM:SS' values were local time
+    (
+        '''CREATE TABLE locations_new 
+           (id INTEGER PRIMARY KEY, user_id INTEGER, latitude REAL, longitude REAL, timestamp INTEGER,
+           FOREIGN KEY(user_id) REFERENCES users(id))''',
+        '''INSERT INTO locations_new (id, user_id, latitude, longitude, timestamp) 
+           SELECT id, user_id, latitude, longitude, 
+                  CASE WHEN typeof(timestamp) = 'text' THEN CAST(strftime('%s', timestamp, 'utc') AS INTEGER) 
+                       ELSE CAST(timestamp AS INTEGER) END 
+           FROM locations''',
+        'DROP TABLE locations',
+        'ALTER TABLE locations_new RENAME TO locations',
+    ),
+    # 3: indexes for the per-user lookups on the alert path
+    (
+        'CREATE INDEX IF NOT EXISTS idx_guardians_user ON guardians (user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_commands_user ON commands (user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_locations_user_time ON locations (user_id, timestamp)',
+    ),
+    # 4: per-user watermark of how far location history has been compacted
+    (
+        '''CREATE TABLE IF NOT EXISTS location_compaction 
+           (user_id INTEGER PRIMARY KEY, compacted_until INTEGER)''',
+    ),
+    # 5: outbox messages expire, so a restart hours later doesn't send stale alerts;
+    # rows queued before this get the default alert lifetime of 30 minutes
+    (
+        'ALTER TABLE outbox ADD COLUMN expires_at REAL',
+        'UPDATE outbox SET expires_at = created_at + 1800',
+    ),
+]
+
+class _ReaderSlot:
+    """A thread's reader connection, held in thread-local storage so it is collected when the thread exits."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+def _release_reader(readers, lock, conn):
+    with lock:
+        if conn not in readers:
+            return  # Already closed by Database.close
+        readers.discard(conn)
+    conn.close()
+
 
 class Database:
-    def __init__(self):
-        # Use check_same_thread=False to allow multi-threaded access
-        self.conn = sqlite3.connect('data/database.db', check_same_thread=False)
-        self.lock = threading.Lock()  # Thread lock for safe access
+    """SQLite store with one serialized writer connection and a reader connection per thread.
+
+    All writes go through `self.conn` under `self.lock`. Reads use the calling
+    thread's own connection and take no lock, so location writes from tracking
+    threads never block guardian reads on the alert path.
+    """
+
+    JOURNAL_MODE = 'WAL'
+
+    def __init__(self, path=DB_PATH, location_flush_size=64, location_flush_interval=5.0, guardian_cache=True):
+        self.path = path
+        # Use check_same_thread=False so any thread can write through the shared writer
+        self.conn = self._connect()
+        # Must precede the first CREATE TABLE to take effect without a full VACUUM
+        self.conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self.conn.execute(f'PRAGMA journal_mode={self.JOURNAL_MODE}')
+        self.lock = threading.Lock()  # Serializes writers
         self.cursor = self.conn.cursor()
+        self.local = threading.local()
+        self.readers = set()  # Open reader connections; each is closed when its thread exits
+        self.readers_lock = threading.Lock()
+        # Write-behind buffer for location fixes: flushed as one transaction by size or age
+        self.location_flush_size = location_flush_size
+        self.location_flush_interval = location_flush_interval
+        self.location_buffer = []
+        self.location_buffer_lock = threading.Lock()
+        self.write_stats = {'location_rows': 0, 'location_commits': 0}
+        # Per-user guardian lists, loaded at login and updated write-through by add_guardian
+        self.guardian_cache_enabled = guardian_cache
+        self.guardian_cache = {}
+        self.guardian_cache_lock = threading.Lock()
+        self.guardian_cache_stats = {'hits': 0, 'misses': 0}
+        self.guardian_generation = 0  # Bumped by every add_guardian
+        self.flusher_stop = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_periodically, daemon=True)
         self.create_tables()
+        self.flusher.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _reader(self):
+        slot = getattr(self.local, 'reader', None)
+        if slot is None:
+            conn = self._connect()
+            conn.execute('PRAGMA query_only=ON')
+            slot = self.local.reader = _ReaderSlot(conn)
+            with self.readers_lock:
+                self.readers.add(conn)
+            # Short-lived threads (tracking, alert workers, retention runs) would otherwise leak one each
+            weakref.finalize(slot, _release_reader, self.readers, self.readers_lock, conn)
+        return slot.conn
+
+    def _fetchall(self, sql, params=()):
+        return self._reader().execute(sql, params).fetchall()
+
+    def _fetchone(self, sql, params=()):
+        return self._reader().execute(sql, params).fetchone()
+
+    def close(self):
+        self.flusher_stop.set()
+        self.flush_locations()
+        with self.readers_lock:
+            for conn in self.readers:
+                conn.close()
+            self.readers.clear()
+        with self.lock:
+            self.conn.close()
 
     def create_tables(self):
+        """Bring the schema up to date by applying the migrations newer than PRAGMA user_version."""
         with self.lock:
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS users 
-                                (id INTEGER PRIMARY KEY, name TEXT, mobile TEXT UNIQUE, 
-                                password TEXT, gender TEXT, dob TEXT)''')
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS guardians 
-                                (id INTEGER PRIMARY KEY, user_id INTEGER, name TEXT, number TEXT,
-                                FOREIGN KEY(user_id) REFERENCES users(id))''')
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS commands 
-                                (id INTEGER PRIMARY KEY, user_id INTEGER, command_text TEXT, audio_file TEXT,
-                                FOREIGN KEY(user_id) REFERENCES users(id))''')
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS locations 
-                                (id INTEGER PRIMARY KEY, user_id INTEGER, latitude REAL, longitude REAL, timestamp TEXT,
-                                FOREIGN KEY(user_id) REFERENCES users(id))''')
-            self.conn.commit()
+            version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+            for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                # Each migration is one transaction, so a crash leaves the old version intact
+                self.conn.execute('BEGIN')
+                try:
+                    for statement in statements:
+                        self.cursor.execute(statement)
+                    self.cursor.execute(f'PRAGMA user_version = {target}')
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+                print(f"Database migrated to schema version {target}")
             print("Database tables created or verified")
 
+    def enable_incremental_vacuum(self):
+        """Switch a database created before incremental vacuum over, with the one full VACUUM that takes.
+
+        The VACUUM holds the writer lock for as long as it runs, so this is
+        left to a background worker rather than done at startup.
+        """
+        with self.lock:
+            if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return False
+            print("Database: enabling incremental vacuum (one-time VACUUM)")
+            self.conn.execute('VACUUM')
+        return True
+
     def add_user(self, name, mobile, password, gender, dob):
         with self.lock:
             try:
@@ -40,25 +203,51 @@ class Database:
                 raise
 
     def get_user(self, mobile):
-        with self.lock:
-            self.cursor.execute('SELECT * FROM users WHERE mobile = ?', (mobile,))
-            user = self.cursor.fetchone()
-            print(f"User fetched: {user}")
-            return user
+        user = self._fetchone('SELECT * FROM users WHERE mobile = ?', (mobile,))
+        print(f"User fetched: {user}")
+        return user
 
     def add_guardian(self, user_id, name, number):
         with self.lock:
             self.cursor.execute('INSERT INTO guardians (user_id, name, number) VALUES (?, ?, ?)',
                               (user_id, name, number))
             self.conn.commit()
+            with self.guardian_cache_lock:
+                self.guardian_generation += 1
+                if user_id in self.guardian_cache:
+                    self.guardian_cache[user_id] = self.guardian_cache[user_id] + [(name, number)]
             print(f"Guardian added for user_id {user_id}: {name}, {number}")
 
     def get_guardians(self, user_id):
-        with self.lock:
-            self.cursor.execute('SELECT name, number FROM guardians WHERE user_id = ?', (user_id,))
-            guardians = self.cursor.fetchall()
-            print(f"Guardians for user_id {user_id}: {guardians}")
-            return guardians
+        """Guardians for the user; served from memory once loaded, so the alert path never waits on SQLite."""
+        with self.guardian_cache_lock:
+            guardians = self.guardian_cache.get(user_id)
+            if guardians is not None:
+                self.guardian_cache_stats['hits'] += 1
+                return list(guardians)
+            self.guardian_cache_stats['misses'] += 1
+            generation = self.guardian_generation
+        guardians = self._fetchall('SELECT name, number FROM guardians WHERE user_id = ?', (user_id,))
+        if self.guardian_cache_enabled:
+            with self.guardian_cache_lock:
+                # Don't cache a read that raced with add_guardian; the next miss reloads it
+                if self.guardian_generation == generation:
+                    guardians = self.guardian_cache.setdefault(user_id, guardians)
+        print(f"Guardians for user_id {user_id}: {guardians}")
+        return list(guardians)
+
+    def load_guardians(self, user_id):
+        """Warm the guardian cache for a user, e.g. at login. Returns False if SQLite was busy."""
+        try:
+            self.get_guardians(user_id)
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"Could not preload guardians for user_id {user_id}: {e}")
+            return False
+
+    def guardian_cache_hit_rate(self):
+        lookups = self.guardian_cache_stats['hits'] + self.guardian_cache_stats['misses']
+        return self.guardian_cache_stats['hits'] / lookups if lookups else 0.0
 
     def add_command(self, user_id, command_text, audio_file):
         with self.lock:
@@ -68,23 +257,160 @@ class Database:
             print(f"Command added for user_id {user_id}: {command_text}, {audio_file}")
 
     def get_commands(self, user_id):
-        with self.lock:
-            self.cursor.execute('SELECT command_text, audio_file FROM commands WHERE user_id = ?', (user_id,))
-            commands = self.cursor.fetchall()
-            print(f"Commands for user_id {user_id}: {commands}")
-            return commands
+        commands = self._fetchall('SELECT command_text, audio_file FROM commands WHERE user_id = ?', (user_id,))
+        print(f"Commands for user_id {user_id}: {commands}")
+        return commands
 
     def save_location(self, user_id, latitude, longitude, timestamp):
+        """Buffer a fix; `timestamp` is integer epoch seconds."""
+        with self.location_buffer_lock:
+            self.location_buffer.append((user_id, latitude, longitude, timestamp))
+            full = len(self.location_buffer) >= self.location_flush_size
+        print(f"Location saved for user_id {user_id}: Lat {latitude}, Lon {longitude}")
+        if full:
+            self.flush_locations()
+
+    def flush_locations(self):
+        """Write all buffered location fixes in one transaction; call before shutdown or when durability matters."""
+        with self.location_buffer_lock:
+            rows, self.location_buffer = self.location_buffer, []
+        if not rows:
+            return 0
         with self.lock:
-            self.cursor.execute('INSERT INTO locations (user_id, latitude, longitude, timestamp) VALUES (?, ?, ?, ?)',
-                              (user_id, latitude, longitude, timestamp))
+            self.cursor.executemany('INSERT INTO locations (user_id, latitude, longitude, timestamp) VALUES (?, ?, ?, ?)',
+                                    rows)
             self.conn.commit()
-            print(f"Location saved for user_id {user_id}: Lat {latitude}, Lon {longitude}")
+            self.write_stats['location_rows'] += len(rows)
+            self.write_stats['location_commits'] += 1
+        return len(rows)
+
+    def _flush_periodically(self):
+        while not self.flusher_stop.wait(self.location_flush_interval):
+            try:
+                self.flush_locations()
+            except Exception as e:
+                print(f"Error flushing locations: {e}")
+
+    def location_write_amplification(self):
+        """Commits (and so WAL syncs) per location row written; 1.0 means one commit per fix."""
+        rows = self.write_stats['location_rows']
+        return self.write_stats['location_commits'] / rows if rows else 0.0
 
     def get_last_location(self, user_id):
-        with self.lock:
-            self.cursor.execute('SELECT latitude, longitude FROM locations WHERE user_id = ? ORDER BY timestamp DESC LIMIT 1',
-                              (user_id,))
-            location = self.cursor.fetchone()
+        with self.location_buffer_lock:
+            buffered = [row for row in self.location_buffer if row[0] == user_id]
+        if buffered:
+            # Newest fix is still in the write-behind buffer
+            location = max(buffered, key=lambda row: row[3])[1:3]
             print(f"Last location for user_id {user_id}: {location}")
-            return location
\ No newline at end of file
+            return location
+        location = self._fetchone('SELECT latitude, longitude FROM locations WHERE user_id = ? ORDER BY timestamp DESC LIMIT 1',
+                                  (user_id,))
+        print(f"Last location for user_id {user_id}: {location}")
+        return location
+
+    def location_users(self):
+        return [row[0] for row in self._fetchall('SELECT DISTINCT user_id FROM locations')]
+
+    def first_location_time(self, user_id, since=0):
+        return self._fetchone('SELECT MIN(timestamp) FROM locations WHERE user_id = ? AND timestamp >= ?',
+                              (user_id, since))[0]
+
+    def location_before(self, user_id, before):
+        """(latitude, longitude) of the user's newest fix with timestamp < before, or None."""
+        return self._fetchone('''SELECT latitude, longitude FROM locations WHERE user_id = ? AND timestamp < ? 
+                                 ORDER BY timestamp DESC, id DESC LIMIT 1''', (user_id, before))
+
+    def get_locations(self, user_id, start, end):
+        """(id, latitude, longitude, timestamp) rows with start <= timestamp < end, oldest first."""
+        return self._fetchall('''SELECT id, latitude, longitude, timestamp FROM locations 
+                                 WHERE user_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp, id''',
+                              (user_id, start, end))
+
+    def get_compaction_watermark(self, user_id):
+        row = self._fetchone('SELECT compacted_until FROM location_compaction WHERE user_id = ?', (user_id,))
+        return row[0] if row else 0
+
+    def delete_locations(self, ids, user_id, compacted_until):
+        """Delete compacted fixes and advance the user's watermark in one transaction."""
+        with self.lock:
+            self.cursor.executemany('DELETE FROM locations WHERE id = ?', [(i,) for i in ids])
+            self.cursor.execute('INSERT OR REPLACE INTO location_compaction (user_id, compacted_until) VALUES (?, ?)',
+                                (user_id, compacted_until))
+            self.conn.commit()
+        return len(ids)
+
+    def incremental_vacuum(self, pages):
+        """Return up to `pages` free pages to the filesystem; returns (released, still free)."""
+        with self.lock:
+            before = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if before:
+                self.conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+            after = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return before - after, after
+
+    def size_bytes(self):
+        page_size = self._fetchone('PRAGMA page_size')[0]
+        return page_size * self._fetchone('PRAGMA page_count')[0]
+
+    def enqueue_messages(self, messages, created_at, expires_at=None):
+        """Queue (idempotency_key, recipient, body) rows; keys already queued are ignored."""
+        with self.lock:
+            self.cursor.executemany('''INSERT OR IGNORE INTO outbox (idempotency_key, recipient, body, next_attempt_at, created_at, expires_at) 
+                                       VALUES (?, ?, ?, ?, ?, ?)''',
+                                    [(key, recipient, body, created_at, created_at, expires_at)
+                                     for key, recipient, body in messages])
+            self.conn.commit()
+            queued = self.cursor.rowcount
+            print(f"Outbox: queued {queued} of {len(messages)} messages")
+            return queued
+
+    def claim_outbox(self, limit, now):
+        """Mark up to `limit` due, unexpired messages as sending and return (id, recipient, body, attempts, created_at)."""
+        with self.lock:
+            self.cursor.execute('''SELECT id, recipient, body, attempts, created_at FROM outbox 
+                                   WHERE status = 'pending' AND next_attempt_at <= ? 
+                                   AND (expires_at IS NULL OR expires_at > ?) ORDER BY id LIMIT ?''', (now, now, limit))
+            rows = self.cursor.fetchall()
+            if rows:
+                self.cursor.executemany("UPDATE outbox SET status = 'sending' WHERE id = ?", [(row[0],) for row in rows])
+                self.conn.commit()
+            return rows
+
+    def mark_outbox_sent(self, message_id, sid, sent_at):
+        with self.lock:
+            self.cursor.execute("UPDATE outbox SET status = 'sent', sid = ?, sent_at = ?, attempts = attempts + 1 WHERE id = ?",
+                              (sid, sent_at, message_id))
+            self.conn.commit()
+
+    def mark_outbox_failed(self, message_id, error, next_attempt_at=None):
+        """Record a failed attempt; reschedule it, or give up when next_attempt_at is None."""
+        with self.lock:
+            status = 'pending' if next_attempt_at is not None else 'failed'
+            self.cursor.execute('''UPDATE outbox SET status = ?, last_error = ?, next_attempt_at = ?, attempts = attempts + 1 
+                                   WHERE id = ?''', (status, error, next_attempt_at, message_id))
+            self.conn.commit()
+
+    def reset_stale_outbox(self):
+        """Return messages left 'sending' by a previous run to the queue."""
+        with self.lock:
+            self.cursor.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+            self.conn.commit()
+            reset = self.cursor.rowcount
+            if reset:
+                print(f"Outbox: {reset} interrupted messages re-queued")
+            return reset
+
+    def expire_outbox(self, now):
+        """Mark pending messages past their expiry as failed rather than send them late; returns how many."""
+        with self.lock:
+            self.cursor.execute('''UPDATE outbox SET status = 'failed', last_error = 'expired' 
+                                   WHERE status = 'pending' AND expires_at <= ?''', (now,))
+            self.conn.commit()
+            expired = self.cursor.rowcount
+            if expired:
+                print(f"Outbox: {expired} expired messages dropped")
+            return expired
+
+    def count_outbox(self, status='pending'):
+        return self._fetchone('SELECT COUNT(*) FROM outbox WHERE status = ?', (status,))[0]
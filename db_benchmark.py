@@ -0,0 +1,200 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from backend.database import Database, MIGRATIONS
+from backend.location_retention import LocationRetention
+
+class GlobalLockDatabase(Database):
+    """The previous design: one connection, rollback journal, every read and write under one lock."""
+
+    JOURNAL_MODE = 'DELETE'
+
+    def __init__(self, path):
+        # No write-behind or guardian cache either: one commit per location fix, every read hits SQLite
+        super().__init__(path, location_flush_size=1, guardian_cache=False)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def _fetchall(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _fetchone(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+
+def run_contention(db_cls, writers, readers, seconds, **options):
+    """Location writers and guardian readers hammer one database; returns read latencies and counts."""
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        db = db_cls(os.path.join(tmp, 'bench.db'), **options)
+        user_id = db.add_user('Bench', '9999999999', 'pw', 'Other', '01-01-2000')
+        for i in range(5):
+            db.add_guardian(user_id, f'Guardian {i}', f'90000000{i:02d}')
+        stop = threading.Event()
+        latencies = []
+        writes = [0]
+        lock = threading.Lock()
+
+        def write_loop():
+            while not stop.is_set():
+                db.save_location(user_id, 12.97, 77.59, int(time.time()))
+                with lock:
+                    writes[0] += 1
+
+        def read_loop():
+            local = []
+            while not stop.is_set():
+                started = time.perf_counter()
+                db.get_guardians(user_id)
+                local.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=write_loop) for _ in range(writers)]
+        threads += [threading.Thread(target=read_loop) for _ in range(readers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        db.close()
+        return sorted(latencies), writes[0]
+
+
+def run_location_writes(n, flush_size):
+    """Time `n` location saves with the given write-behind batch size (1 = commit every fix)."""
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        db = Database(os.path.join(tmp, 'bench.db'), location_flush_size=flush_size)
+        started = time.perf_counter()
+        for i in range(n):
+            db.save_location(1, 12.97 + i * 1e-6, 77.59, 1704067200 + i)
+        db.flush_locations()
+        elapsed = time.perf_counter() - started
+        stats = dict(db.write_stats, amplification=db.location_write_amplification())
+        db.close()
+    return elapsed, stats
+
+
+def build_legacy_database(path, rows, users):
+    """A schema-version-0 database (TEXT timestamps, no indexes) holding `rows` location fixes."""
+    conn = sqlite3.connect(path)
+    for statement in MIGRATIONS[0]:
+        conn.execute(statement)
+    conn.executemany('INSERT INTO guardians (user_id, name, number) VALUES (?, ?, ?)',
+                     ((u, f'Guardian {g}', f'90000{u:03d}{g:02d}') for u in range(users) for g in range(3)))
+    start = 1704067200
+    conn.executemany('INSERT INTO locations (user_id, latitude, longitude, timestamp) VALUES (?, ?, ?, ?)',
+                     ((i % users, 12.97, 77.59, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start + i // users)))
+                      for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def time_queries(path, users, n):
+    """Mean latency in ms of the get_last_location and get_guardians queries over random users."""
+    conn = sqlite3.connect(path)
+    timings = {}
+    for name, sql in (('last_location', 'SELECT latitude, longitude FROM locations WHERE user_id = ? ORDER BY timestamp DESC LIMIT 1'),
+                      ('guardians', 'SELECT name, number FROM guardians WHERE user_id = ?')):
+        started = time.perf_counter()
+        for _ in range(n):
+            conn.execute(sql, (random.randrange(users),)).fetchall()
+        timings[name] = (time.perf_counter() - started) / n * 1000
+    conn.close()
+    return timings
+
+
+def run_query_benchmark(rows, users, n):
+    """Time the hot per-user queries on a legacy database, migrate it, and time them again."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        build_legacy_database(path, rows, users)
+        before = time_queries(path, users, n)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            Database(path).close()
+        migration = time.perf_counter() - started
+        after = time_queries(path, users, n)
+    return before, after, migration
+
+
+def run_retention_benchmark(days, interval, retention):
+    """Simulate `days` of tracking (fix every `interval` s) and sample size and query time monthly."""
+    samples = []
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        db = Database(os.path.join(tmp, 'bench.db'), location_flush_size=512)
+        compactor = LocationRetention(db)
+        lat, lon = 12.97, 77.59
+        start = 1704067200
+        for day in range(days):
+            for step in range(86400 // interval):
+                # Mostly stationary, with a two-hour walk each morning
+                if 8 * 3600 <= step * interval < 10 * 3600:
+                    lat += rng.uniform(-1, 1) * 1e-4
+                    lon += rng.uniform(-1, 1) * 1e-4
+                db.save_location(1, lat, lon, start + day * 86400 + step * interval)
+            db.flush_locations()
+            if retention:
+                # Hourly, as the worker runs, so partial days must not be compacted early
+                for hour in range(24):
+                    compactor.run_once(now=start + day * 86400 + (hour + 1) * 3600)
+                compactor.vacuum()
+            if (day + 1) % 30 == 0:
+                started = time.perf_counter()
+                for _ in range(200):
+                    db._fetchall('SELECT latitude, longitude FROM locations WHERE user_id = ? AND timestamp >= ? ORDER BY timestamp',
+                                 (1, start + (day - 6) * 86400))
+                query_ms = (time.perf_counter() - started) / 200 * 1000
+                rows = db._fetchone('SELECT COUNT(*) FROM locations')[0]
+                samples.append((day + 1, rows, db.size_bytes(), query_ms))
+        db.close()
+    return samples
+
+
+def report(name, latencies, writes, seconds):
+    pct = lambda q: latencies[int(q * (len(latencies) - 1))] * 1000 if latencies else float('nan')
+    print(f"{name:<12} reads/s={len(latencies) / seconds:>9.0f}  writes/s={writes / seconds:>7.0f}  "
+          f"read p50={pct(0.5):.3f}ms  p99={pct(0.99):.3f}ms  max={pct(1.0):.3f}ms")
+
+
+if __name__ == '__main__':
+    # Run from the project root: python -m backend.db_benchmark
+    parser = argparse.ArgumentParser(description="Guardian read latency under concurrent location writes")
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--locations', type=int, default=5000)
+    parser.add_argument('--history', type=int, default=2000000, help="location rows for the query benchmark")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--days', type=int, default=90, help="simulated tracking history for the retention benchmark")
+    args = parser.parse_args()
+    # Each row adds one change, so its gain isn't credited to the ones before it:
+    # WAL + per-thread readers, then write-behind batching, then the guardian cache
+    for name, cls, options in (('global-lock', GlobalLockDatabase, {}),
+                               ('wal-pool', Database, {'location_flush_size': 1, 'guardian_cache': False}),
+                               ('wal-batched', Database, {'guardian_cache': False}),
+                               ('wal-cached', Database, {})):
+        latencies, writes = run_contention(cls, args.writers, args.readers, args.seconds, **options)
+        report(name, latencies, writes, args.seconds)
+    for flush_size in (1, 64):
+        elapsed, stats = run_location_writes(args.locations, flush_size)
+        print(f"flush={flush_size:<4}     {args.locations / elapsed:>9.0f} fixes/s  commits={stats['location_commits']}  "
+              f"commits/row={stats['amplification']:.3f}")
+    before, after, migration = run_query_benchmark(args.history, args.users, 200)
+    print(f"{args.history} location rows, migrated in {migration:.1f}s")
+    for name in before:
+        print(f"{name:<14} before={before[name]:.3f}ms  after={after[name]:.3f}ms")
+    for retention in (False, True):
+        print(f"retention={'on' if retention else 'off'}")
+        for day, rows, size, query_ms in run_retention_benchmark(args.days, 30, retention):
+            print(f"  day {day:>4}  rows={rows:>8}  size={size / 1e6:>7.1f}MB  last-week track={query_ms:.2f}ms")
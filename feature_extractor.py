@@ -0,0 +1,105 @@
+import numpy as np
+import librosa
+
+# Feature parameters shared by model training and live inference
+SAMPLE_RATE = 44100
+N_MFCC = 20
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+MAX_TIME_STEPS = 862
+TOP_DB = 80.0
+AMIN = 1e-10
+
+class MFCCExtractor:
+    """MFCC features equivalent to ``librosa.feature.mfcc`` with its defaults.
+
+    The FFT window, mel filterbank and DCT matrix are built once, so each clip
+    only pays for framing, one batched rfft and two matrix products. Clips of
+    the same length are stacked and processed as a single array.
+    """
+
+    def __init__(self, sr=SAMPLE_RATE, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH,
+                 n_mels=N_MELS, max_time_steps=MAX_TIME_STEPS, normalize=True):
+        self.sr = sr
+        self.n_mfcc = n_mfcc
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.max_time_steps = max_time_steps
+        self.normalize = normalize
+        self.window = librosa.filters.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).astype(np.float32)
+        self.dct_matrix = _dct_matrix(n_mels)[:n_mfcc]
+
+    @property
+    def params(self):
+        """Everything that changes the feature values, e.g. for cache keys."""
+        return {'sr': self.sr, 'n_mfcc': self.n_mfcc, 'n_fft': self.n_fft, 'hop_length': self.hop_length,
+                'n_mels': self.mel_basis.shape[0], 'max_time_steps': self.max_time_steps, 'normalize': self.normalize}
+
+    def frames_for_samples(self, n_samples):
+        return 1 + n_samples // self.hop_length
+
+    def mel_power(self, frames):
+        """Mel power spectrum of windowed frames (..., n_fft) -> (..., n_mels)."""
+        spectrum = np.fft.rfft(frames * self.window, axis=-1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        return power @ self.mel_basis.T
+
+    def mfcc_from_mel(self, mel, peak=1.0):
+        """MFCCs (..., n_mfcc, frames) from mel power frames (..., frames, n_mels).
+
+        `peak` is the clip's peak amplitude; dividing the power by peak**2 is
+        the same as peak-normalising the waveform before the STFT.
+        """
+        peak = np.asarray(peak, dtype=np.float32)
+        mel = mel / np.where(peak > 0, peak * peak, 1.0)[..., np.newaxis, np.newaxis]
+        log_mel = 10.0 * np.log10(np.maximum(AMIN, mel))
+        floor = log_mel.max(axis=(-2, -1), keepdims=True) - TOP_DB
+        log_mel = np.maximum(log_mel, floor)
+        return self.dct_matrix @ np.swapaxes(log_mel, -1, -2)
+
+    def mfcc(self, y):
+        """MFCC matrix (n_mfcc, frames) of one clip."""
+        return self.mfcc_batch(np.asarray(y, dtype=np.float32)[np.newaxis])[0]
+
+    def mfcc_batch(self, Y):
+        """MFCCs (batch, n_mfcc, frames) for a stacked (batch, samples) array of equal-length clips."""
+        Y = np.asarray(Y, dtype=np.float32)
+        padded = np.pad(Y, ((0, 0), (self.n_fft // 2, self.n_fft // 2)))
+        frames = np.lib.stride_tricks.sliding_window_view(padded, self.n_fft, axis=-1)[:, ::self.hop_length]
+        peak = np.abs(Y).max(axis=-1) if self.normalize and Y.shape[-1] else np.ones(len(Y), dtype=np.float32)
+        return self.mfcc_from_mel(self.mel_power(frames), peak)
+
+    def fix_length(self, mfcc):
+        """Pad with zeros or truncate the time axis to max_time_steps."""
+        steps = mfcc.shape[-1]
+        if steps < self.max_time_steps:
+            pad = [(0, 0)] * (mfcc.ndim - 1) + [(0, self.max_time_steps - steps)]
+            return np.pad(mfcc, pad, mode='constant')
+        return mfcc[..., :self.max_time_steps]
+
+    def extract(self, y):
+        """Fixed-size (n_mfcc, max_time_steps) features for one clip."""
+        return self.fix_length(self.mfcc(y))
+
+    def extract_batch(self, clips):
+        """Fixed-size features (len(clips), n_mfcc, max_time_steps) for a list of clips.
+
+        Clips are grouped by length so every group runs as one stacked array.
+        """
+        out = np.zeros((len(clips), self.n_mfcc, self.max_time_steps), dtype=np.float32)
+        by_length = {}
+        for i, clip in enumerate(clips):
+            by_length.setdefault(len(clip), []).append(i)
+        for indices in by_length.values():
+            out[indices] = self.fix_length(self.mfcc_batch(np.stack([clips[i] for i in indices])))
+        return out
+
+
+def _dct_matrix(n):
+    # Orthonormal DCT-II, the transform librosa applies to the log-mel bands
+    k = np.arange(n)[:, np.newaxis]
+    basis = np.cos(np.pi * k * (2 * np.arange(n) + 1) / (2 * n)) * np.sqrt(2.0 / n)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
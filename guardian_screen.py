@@ -3,15 +3,14 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
 from kivy.uix.label import Label
-from backend.messaging_service import MessagingService
 from kivy.utils import get_color_from_hex
 
 class GuardianScreen(Screen):
-    def __init__(self, db, **kwargs):
+    def __init__(self, db, messaging, **kwargs):
         super().__init__(**kwargs)
         self.db = db
         self.user_id = None
-        self.messaging = MessagingService()
+        self.messaging = messaging
 
         layout = BoxLayout(orientation='vertical', padding=40, spacing=20)
         layout.size_hint = (0.9, 0.9)
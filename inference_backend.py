@@ -0,0 +1,85 @@
+import threading
+import numpy as np
+
+class KerasBackend:
+    """Runs the full Keras model; requires TensorFlow."""
+
+    name = 'keras'
+
+    def __init__(self, path):
+        import tensorflow as tf
+        self.model = tf.keras.models.load_model(path)
+        self.input_shape = tuple(self.model.input_shape)
+
+    def predict(self, batch):
+        """Return one probability per item in `batch`."""
+        # Direct call skips predict()'s per-call dataset/callback setup
+        return np.asarray(self.model(np.asarray(batch, dtype=np.float32), training=False))[:, 0]
+
+
+class TFLiteBackend:
+    """Runs an exported .tflite model (float32, float16 or int8 quantized).
+
+    Uses the standalone tflite_runtime interpreter when it is installed so the
+    app never imports TensorFlow, and falls back to tf.lite otherwise.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, path, num_threads=None):
+        self.interpreter = _load_interpreter()(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_detail = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(self.input_detail['shape'][1:])
+        self.batch_size = int(self.input_detail['shape'][0])
+        # An interpreter holds its tensors in place, so calls must not overlap
+        self.lock = threading.Lock()
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self.lock:
+            if batch.shape[0] != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input_detail['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self.input_detail = self.interpreter.get_input_details()[0]
+                self.output_detail = self.interpreter.get_output_details()[0]
+                self.batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self.input_detail['index'], _quantize(batch, self.input_detail))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output_detail['index'])
+        return _dequantize(output, self.output_detail)[:, 0]
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+}
+
+def load_backend(kind, path):
+    try:
+        backend_cls = BACKENDS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend '{kind}', expected one of {sorted(BACKENDS)}")
+    return backend_cls(path)
+
+def _load_interpreter():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+def _quantize(batch, detail):
+    if detail['dtype'] == np.float32:
+        return batch
+    scale, zero_point = detail['quantization']
+    info = np.iinfo(detail['dtype'])
+    return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(detail['dtype'])
+
+def _dequantize(output, detail):
+    if detail['dtype'] == np.float32:
+        return output
+    scale, zero_point = detail['quantization']
+    return (output.astype(np.float32) - zero_point) * scale
@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+class _Request:
+    __slots__ = ('user_id', 'features', 'future', 'callback', 'submitted')
+
+    def __init__(self, user_id, features, callback):
+        self.user_id = user_id
+        self.features = features
+        self.future = Future()
+        self.callback = callback
+        self.submitted = time.monotonic()
+
+
+class InferenceScheduler:
+    """Micro-batches model inputs from many monitors into one predict call.
+
+    Requests are collected until `max_batch_size` are pending or the oldest
+    has waited `max_wait` seconds, then the whole batch runs through a single
+    `model.predict` and each probability is routed back to its submitter.
+
+    Only worth it with several continuous monitors in one process (the app
+    runs a single triggered one). To enable, start one scheduler on the
+    shared model and pass it to each of them:
+
+        scheduler = InferenceScheduler(ScreamDetector().model)
+        scheduler.start()
+        AudioMonitor(user_id, db, continuous=True, scheduler=scheduler)
+    """
+
+    def __init__(self, model, max_batch_size=16, max_wait=0.02):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.running = False
+        self.thread = None
+        self.stats = {'batches': 0, 'requests': 0, 'errors': 0, 'queue_wait': 0.0}
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        print(f"Inference scheduler started: max_batch_size={self.max_batch_size}, max_wait={self.max_wait}s")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+
+    def submit(self, user_id, features, callback=None):
+        """Queue one model input; `callback(user_id, probability)` runs on the scheduler thread."""
+        request = _Request(user_id, features, callback)
+        self.queue.put(request)
+        return request.future
+
+    def average_batch_size(self):
+        return self.stats['requests'] / self.stats['batches'] if self.stats['batches'] else 0.0
+
+    def _collect(self):
+        try:
+            batch = [self.queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = batch[0].submitted + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self.running:
+            batch = self._collect()
+            if not batch:
+                continue
+            started = time.monotonic()
+            try:
+                probabilities = self.model.predict(np.stack([r.features for r in batch]))
+            except Exception as e:
+                print(f"Error in batched inference: {e}")
+                self.stats['errors'] += 1
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            self.stats['batches'] += 1
+            self.stats['requests'] += len(batch)
+            self.stats['queue_wait'] += sum(started - r.submitted for r in batch)
+            for request, probability in zip(batch, probabilities):
+                probability = float(probability)
+                request.future.set_result(probability)
+                if request.callback:
+                    try:
+                        request.callback(request.user_id, probability)
+                    except Exception as e:
+                        print(f"Error in inference callback for user_id {request.user_id}: {e}")
+
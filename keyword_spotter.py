@@ -0,0 +1,296 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+from backend.audio_archive import read_wav
+from backend.feature_extractor import MFCCExtractor
+from backend.streaming_mfcc import StreamingMFCC
+
+# Keyword front end: 23 ms frames every 10 ms at the app's capture rate
+KWS_SAMPLE_RATE = 44100
+KWS_N_FFT = 1024
+KWS_HOP_LENGTH = 441
+KWS_N_MELS = 40
+KWS_N_MFCC = 13
+MODEL_DIR = 'data'
+
+def kws_extractor():
+    return MFCCExtractor(sr=KWS_SAMPLE_RATE, n_mfcc=KWS_N_MFCC, n_fft=KWS_N_FFT,
+                         hop_length=KWS_HOP_LENGTH, n_mels=KWS_N_MELS)
+
+def frame_features(extractor, y):
+    """Mel power frames and per-frame peaks of a whole clip, framed exactly like the live stream."""
+    stream = StreamingMFCC(extractor, max_seconds=len(y) / extractor.sr + 1)
+    n = stream.push(y)
+    return stream.mel_frames.latest(n).copy(), stream.frame_peaks.latest(n).copy()
+
+def phrase_span(mel, top_db=25):
+    """First and last frame within top_db of the loudest frame, i.e. where the speech is."""
+    energy_db = 10 * np.log10(mel.sum(axis=1) + 1e-10)
+    voiced = np.flatnonzero(energy_db > energy_db.max() - top_db)
+    return voiced[0], voiced[-1] + 1
+
+
+class KeywordSpotter:
+    """Small on-device model that spots the user's own trigger phrase in live audio.
+
+    The model is one temporal conv layer over MFCC frames (ReLU, max over
+    time) followed by a logistic output, trained in NumPy from the phrases
+    the user recorded on VoiceScreen. Live audio is pushed chunk by chunk;
+    every `hop_seconds` the newest window of frames is scored, and frames
+    come from StreamingMFCC, so a hop only pays for its own ~10 frames.
+    """
+
+    def __init__(self, window_frames=100, n_filters=16, filter_width=9, threshold=0.8, hop_seconds=0.1, seed=0):
+        self.extractor = kws_extractor()
+        self.filter_width = filter_width
+        self.threshold = threshold
+        self.hop_frames = max(1, int(round(hop_seconds * KWS_SAMPLE_RATE / KWS_HOP_LENGTH)))
+        rng = np.random.default_rng(seed)
+        n_in = KWS_N_MFCC * filter_width
+        self.weights = {
+            'conv': rng.normal(0, np.sqrt(2.0 / n_in), (n_in, n_filters)).astype(np.float32),
+            'conv_bias': np.zeros(n_filters, dtype=np.float32),
+            'dense': rng.normal(0, np.sqrt(1.0 / n_filters), n_filters).astype(np.float32),
+            'dense_bias': np.zeros(1, dtype=np.float32),
+            # Per-coefficient standardisation, fitted on the training frames
+            'mean': np.zeros(KWS_N_MFCC, dtype=np.float32),
+            'std': np.ones(KWS_N_MFCC, dtype=np.float32),
+        }
+        self.stats = {'hops': 0, 'detections': 0, 'score_ms': 0.0}
+        self.set_window(window_frames)
+
+    def set_window(self, window_frames):
+        self.window_frames = int(window_frames)
+        seconds = self.window_frames * KWS_HOP_LENGTH / KWS_SAMPLE_RATE
+        self.stream = StreamingMFCC(self.extractor, max_seconds=seconds + 1)
+        self.reset()
+
+    @property
+    def window_seconds(self):
+        return self.window_frames * KWS_HOP_LENGTH / KWS_SAMPLE_RATE
+
+    def reset(self):
+        """Forget buffered audio, e.g. after a detection so the same phrase can't fire twice."""
+        self.stream.reset()
+        self.frames_since_score = 0
+
+    def windows(self, mel, peaks, ends):
+        """MFCC windows (len(ends), window_frames, n_mfcc) ending at the given frame indices."""
+        W = self.window_frames
+        starts = np.asarray(ends) - W
+        mel_windows = np.lib.stride_tricks.sliding_window_view(mel, W, axis=0)[starts]
+        window_peaks = np.lib.stride_tricks.sliding_window_view(peaks, W).max(axis=-1)[starts]
+        mfcc = self.extractor.mfcc_from_mel(np.swapaxes(mel_windows, -1, -2), window_peaks)
+        return np.swapaxes(mfcc, -1, -2).astype(np.float32)
+
+    def _forward(self, features):
+        w = self.weights
+        features = (features - w['mean']) / w['std']
+        patches = np.lib.stride_tricks.sliding_window_view(features, self.filter_width, axis=1)
+        patches = patches.reshape(len(features), patches.shape[1], -1)
+        hidden = patches @ w['conv'] + w['conv_bias']
+        strongest = hidden.argmax(axis=1)
+        pooled = np.maximum(hidden.max(axis=1), 0)
+        logits = pooled @ w['dense'] + w['dense_bias'][0]
+        return 1.0 / (1.0 + np.exp(-logits)), patches, strongest, pooled
+
+    def score(self, features):
+        """Keyword probability for each window in a (batch, window_frames, n_mfcc) array."""
+        return self._forward(features)[0]
+
+    def fit(self, features, labels, epochs=40, batch_size=128, learning_rate=0.01, seed=0):
+        """Train with Adam on class-balanced binary cross-entropy; returns training accuracy."""
+        rng = np.random.default_rng(seed)
+        labels = np.asarray(labels, dtype=np.float32)
+        w = self.weights
+        w['mean'] = features.mean(axis=(0, 1))
+        w['std'] = features.std(axis=(0, 1)) + 1e-6
+        positive_share = labels.mean()
+        sample_weights = np.where(labels > 0, 0.5 / positive_share, 0.5 / (1 - positive_share))
+        trained = ('conv', 'conv_bias', 'dense', 'dense_bias')
+        m = {name: np.zeros_like(w[name]) for name in trained}
+        v = {name: np.zeros_like(w[name]) for name in trained}
+        step = 0
+        for _ in range(epochs):
+            order = rng.permutation(len(labels))
+            for i in range(0, len(order), batch_size):
+                batch = order[i:i + batch_size]
+                p, patches, strongest, pooled = self._forward(features[batch])
+                d_logits = sample_weights[batch] * (p - labels[batch]) / sample_weights[batch].sum()
+                # Only the strongest position of each active filter receives gradient
+                d_hidden = d_logits[:, np.newaxis] * w['dense'] * (pooled > 0)
+                selected = patches[np.arange(len(batch))[:, np.newaxis], strongest]
+                grads = {
+                    'conv': np.einsum('nk,nkd->dk', d_hidden, selected),
+                    'conv_bias': d_hidden.sum(axis=0),
+                    'dense': pooled.T @ d_logits,
+                    'dense_bias': np.array([d_logits.sum()]),
+                }
+                step += 1
+                for name in trained:
+                    m[name] = 0.9 * m[name] + 0.1 * grads[name]
+                    v[name] = 0.999 * v[name] + 0.001 * grads[name] ** 2
+                    update = (m[name] / (1 - 0.9 ** step)) / (np.sqrt(v[name] / (1 - 0.999 ** step)) + 1e-8)
+                    w[name] = (w[name] - learning_rate * update).astype(np.float32)
+        return float(np.mean((self.score(features) >= self.threshold) == (labels > 0)))
+
+    def _examples(self, y, rng, speed, snr_db):
+        """Positive and negative windows from one augmented copy of a recording."""
+        if speed != 1.0:
+            y = np.interp(np.arange(0, len(y) - 1, speed), np.arange(len(y)), y).astype(np.float32)
+        # Lead-in so windows that end before the phrase exist even if it starts right away
+        y = np.concatenate((np.zeros(self.window_frames * KWS_HOP_LENGTH, dtype=np.float32), y))
+        start, end = phrase_span(frame_features(self.extractor, y)[0])
+        voiced_rms = np.sqrt(np.mean(y[start * KWS_HOP_LENGTH:end * KWS_HOP_LENGTH] ** 2)) + 1e-6
+        noise_std = voiced_rms * 10 ** (-snr_db / 20)
+        y = y + rng.normal(0, noise_std, len(y)).astype(np.float32)
+        mel, peaks = frame_features(self.extractor, y)
+        W, total = self.window_frames, len(mel)
+        slack = self.hop_frames * 2
+        positive = np.arange(max(end, W), min(end + slack, total) + 1)
+        # Nothing of the phrase yet, at most three quarters of it, or only what follows it
+        negative = np.concatenate((np.arange(W, max(W, end - (end - start) // 4)),
+                                   np.arange(min(end + W, total + 1), total + 1)))
+        if len(negative) > 3 * len(positive):
+            negative = rng.choice(negative, 3 * len(positive), replace=False)
+        count = min(len(positive), total + 1 - W)
+        # Reversed speech keeps the spectrum but not the phrase
+        reverse = rng.choice(np.arange(W, total + 1), count, replace=False)
+        # A phrase cut off part way and followed by silence must not fire either
+        cut = start + int(rng.uniform(0.3, 0.7) * (end - start))
+        truncated = y.copy()
+        lo, hi = cut * KWS_HOP_LENGTH, end * KWS_HOP_LENGTH
+        truncated[lo:hi] = rng.normal(0, noise_std, hi - lo)
+        truncated_mel, truncated_peaks = frame_features(self.extractor, truncated)
+        after_cut = rng.choice(np.arange(max(cut, W), total + 1), min(count, total + 1 - max(cut, W)), replace=False)
+        return (self.windows(mel, peaks, positive),
+                np.concatenate((self.windows(mel, peaks, negative),
+                                self.windows(mel[::-1].copy(), peaks[::-1].copy(), reverse),
+                                self.windows(truncated_mel, truncated_peaks, after_cut))))
+
+    def train(self, recordings, variants=8, seed=0):
+        """Fit the model on recordings of the trigger phrase; returns training accuracy."""
+        rng = np.random.default_rng(seed)
+        clips = []
+        for path in recordings:
+            samples, rate = read_wav(path)
+            if rate != KWS_SAMPLE_RATE:
+                print(f"Skipping {path}: recorded at {rate} Hz, expected {KWS_SAMPLE_RATE}")
+                continue
+            clips.append(samples.astype(np.float32) / 32768.0)
+        if not clips:
+            raise ValueError("No usable command recordings to train the keyword spotter")
+        # Window covers the longest phrase plus a little context
+        spans = [phrase_span(frame_features(self.extractor, y)[0]) for y in clips]
+        longest = max(end - start for start, end in spans)
+        self.set_window(np.clip(longest + 2 * self.hop_frames, 50, 200))
+        positives, negatives = [], []
+        for y in clips:
+            for i in range(variants):
+                speed, snr_db = (1.0, 40.0) if i == 0 else (rng.uniform(0.9, 1.1), rng.uniform(5, 30))
+                pos, neg = self._examples(y, rng, speed, snr_db)
+                positives.append(pos)
+                negatives.append(neg)
+        # Background noise alone
+        noise = rng.normal(0, rng.uniform(0.001, 0.05), 3 * KWS_SAMPLE_RATE).astype(np.float32)
+        mel, peaks = frame_features(self.extractor, noise)
+        negatives.append(self.windows(mel, peaks, np.arange(self.window_frames, len(mel) + 1, self.hop_frames)))
+        positives = np.concatenate(positives)
+        negatives = np.concatenate(negatives)
+        features = np.concatenate((positives, negatives))
+        labels = np.concatenate((np.ones(len(positives)), np.zeros(len(negatives))))
+        started = time.perf_counter()
+        accuracy = self.fit(features, labels, seed=seed)
+        print(f"Keyword spotter trained on {len(recordings)} recordings ({len(positives)} positive, "
+              f"{len(negatives)} negative windows) in {time.perf_counter() - started:.1f}s, accuracy {accuracy:.3f}")
+        return accuracy
+
+    def push(self, samples):
+        """Feed live audio; returns the keyword probability whenever a hop completes, else None."""
+        self.frames_since_score += self.stream.push(samples)
+        if self.frames_since_score < self.hop_frames or self.stream.frames_available < self.window_frames:
+            return None
+        self.frames_since_score = 0
+        started = time.perf_counter()
+        mfcc = self.stream.window_mfcc(self.window_frames)
+        probability = float(self.score(mfcc.T[np.newaxis].astype(np.float32))[0])
+        self.stats['hops'] += 1
+        self.stats['score_ms'] += (time.perf_counter() - started) * 1000
+        return probability
+
+    def detect(self, samples):
+        """Push live audio and return True when the trigger phrase was just heard."""
+        probability = self.push(samples)
+        if probability is None or probability < self.threshold:
+            return False
+        self.stats['detections'] += 1
+        print(f"Keyword detected: probability={probability:.2f}")
+        return True
+
+    def mean_score_ms(self):
+        return self.stats['score_ms'] / self.stats['hops'] if self.stats['hops'] else 0.0
+
+    def save(self, path, sources=()):
+        # Written aside and renamed into place, so a listener never loads a half-written model
+        partial = path + '.partial.npz'
+        np.savez(partial, window_frames=self.window_frames, threshold=self.threshold,
+                 sources=json.dumps(list(sources)), **self.weights)
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            n_in, n_filters = data['conv'].shape
+            spotter = cls(window_frames=int(data['window_frames']), n_filters=n_filters,
+                          filter_width=n_in // KWS_N_MFCC, threshold=float(data['threshold']))
+            for name in spotter.weights:
+                spotter.weights[name] = data[name]
+        return spotter
+
+
+def user_recordings(db, user_id):
+    """The user's command recordings that exist on disk, with (path, mtime, size) to detect changes."""
+    recordings = sorted({audio_file for _, audio_file in db.get_commands(user_id)
+                         if audio_file and os.path.exists(audio_file)})
+    return recordings, [[path, os.path.getmtime(path), os.path.getsize(path)] for path in recordings]
+
+
+_train_lock = threading.Lock()
+
+def _load_current(path, sources):
+    """The model saved at `path` if it was trained on exactly `sources`, else None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            current = json.loads(str(data['sources'])) == sources
+        if current:
+            print(f"Keyword spotter loaded: {path}")
+            return KeywordSpotter.load(path)
+    except Exception as e:
+        print(f"Error loading keyword spotter {path}: {e}")
+    return None
+
+def load_user_spotter(db, user_id, model_dir=MODEL_DIR, train=True):
+    """The user's keyword model, retrained when their recordings change; None if they have none.
+
+    Training takes a few seconds, so it belongs at enrollment and login;
+    with train=False a missing or out-of-date model gives None instead.
+    """
+    recordings, sources = user_recordings(db, user_id)
+    if not recordings:
+        return None
+    path = os.path.join(model_dir, f"kws_{user_id}.npz")
+    spotter = _load_current(path, sources)
+    if spotter is not None or not train:
+        return spotter
+    with _train_lock:
+        # Enrollment and login may both ask; whoever waited finds the model already saved
+        spotter = _load_current(path, sources)
+        if spotter is None:
+            spotter = KeywordSpotter()
+            spotter.train(recordings)
+            spotter.save(path, sources)
+    return spotter
@@ -0,0 +1,105 @@
+import math
+import threading
+import time
+
+def haversine_m(a, b):
+    """Great-circle distance in metres between two (lat, lon) points."""
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+class LiveUpdateScheduler:
+    """Decides which live-location fixes are worth an SMS to the guardians.
+
+    - Fixes closer than `min_distance_m` to the last one sent are suppressed.
+    - Only the newest pending fix is kept, so fixes that arrive while a send
+      is in flight are coalesced into one update.
+    - `next_interval()` adapts the polling interval to movement speed: fast
+      movement polls every `min_interval`, a stationary user every `max_interval`.
+    """
+
+    def __init__(self, send, min_distance_m=25.0, min_interval=10.0, max_interval=120.0, initial_interval=30.0):
+        self.send = send
+        self.min_distance_m = min_distance_m
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = initial_interval
+        self.last_sent = None
+        self.last_fix = None
+        self.pending = None
+        self.stop_at = None  # Monotonic end of sharing, set and enforced by whoever started the scheduler
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        self.stats = {'fixes': 0, 'repeated': 0, 'sent': 0, 'suppressed': 0, 'coalesced': 0}
+
+    def start(self, initial_location=None):
+        # The alert itself already carried this location
+        self.last_sent = initial_location
+        self.last_fix = (initial_location, time.monotonic()) if initial_location else None
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+        print(f"Live updates stopped: {self.stats}")
+
+    def submit(self, location, fixed_at=None):
+        """Tracking callback: record a fix and let the sender pick up the latest one.
+
+        `fixed_at` is the monotonic time the fix was fetched. A fix already
+        seen (served again from cache or after throttling) or of unknown age
+        (None, e.g. the last location from the database) says nothing about
+        movement, so it leaves the interval alone and is only sent if
+        nothing has been sent yet.
+        """
+        if not (location and isinstance(location, tuple)):
+            return
+        with self.lock:
+            self.stats['fixes'] += 1
+            if fixed_at is None or (self.last_fix and fixed_at <= self.last_fix[1]):
+                self.stats['repeated'] += 1
+                if self.last_sent is not None or self.pending is not None:
+                    return
+            else:
+                if self.last_fix:
+                    previous, at = self.last_fix
+                    speed = haversine_m(previous, location) / max(fixed_at - at, 1e-3)
+                    # Poll about once per min_distance_m of travel, within bounds
+                    interval = self.min_distance_m / speed if speed > 0 else self.max_interval
+                    self.interval = min(self.max_interval, max(self.min_interval, interval))
+                self.last_fix = (location, fixed_at)
+                if self.pending is not None:
+                    self.stats['coalesced'] += 1
+            self.pending = location
+        self.wakeup.set()
+
+    def next_interval(self):
+        return self.interval
+
+    def _run(self):
+        while self.running:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            with self.lock:
+                location, self.pending = self.pending, None
+            if location is None or not self.running:
+                continue
+            if self.last_sent and haversine_m(self.last_sent, location) < self.min_distance_m:
+                self.stats['suppressed'] += 1
+                continue
+            try:
+                self.send(location)
+                self.last_sent = location
+                self.stats['sent'] += 1
+            except Exception as e:
+                print(f"Failed to send live update: {e}")
@@ -0,0 +1,143 @@
+import math
+import threading
+import time
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+
+def douglas_peucker(points, epsilon_m):
+    """Boolean mask of the (lat, lon) points to keep so the track stays within epsilon_m metres.
+
+    Endpoints are always kept. Repeated fixes of a stationary user deviate by
+    zero, so runs of duplicates collapse to their first and last point.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    # Local equirectangular projection; accurate to well under a metre over a day's track
+    lat0 = math.radians(points[:, 0].mean())
+    xy = np.radians(points[:, ::-1]) * EARTH_RADIUS_M
+    xy[:, 0] *= math.cos(lat0)
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a, b = xy[first], xy[last]
+        inner = xy[first + 1:last]
+        ab = b - a
+        length = math.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (inner[:, 1] - a[1]) - ab[1] * (inner[:, 0] - a[0])) / length
+        i = int(dist.argmax())
+        if dist[i] > epsilon_m:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+class LocationRetention:
+    """Background compaction of the locations table.
+
+    Fixes younger than `raw_days` are left untouched. Older ones are
+    simplified with Douglas-Peucker (`epsilon_m`) one whole UTC day at a
+    time, only once the entire day has aged out, so window boundaries don't
+    depend on how often the worker runs. Each day is anchored on the last
+    fix kept before it, so a stationary day shrinks to a single row and a
+    journey keeps only its turns. A per-user watermark means each day is
+    compacted once. Freed pages are returned to the filesystem with
+    incremental vacuum in small steps between writes.
+    """
+
+    def __init__(self, db, raw_days=2, epsilon_m=25.0, interval=3600.0, vacuum_step=256):
+        self.db = db
+        self.raw_seconds = int(raw_days * 86400)
+        self.epsilon_m = epsilon_m
+        self.interval = interval
+        self.vacuum_step = vacuum_step  # Pages released per writer-lock hold
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        self.stats = {'runs': 0, 'scanned': 0, 'deleted': 0, 'vacuumed_pages': 0}
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        print("Location retention started")
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+        print("Location retention stopped")
+
+    def _run(self):
+        try:
+            self.db.enable_incremental_vacuum()
+        except Exception as e:
+            print(f"Location retention error: {e}")
+        while self.running:
+            try:
+                self.run_once()
+                self.vacuum()
+            except Exception as e:
+                print(f"Location retention error: {e}")
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def run_once(self, now=None):
+        """Compact every user's fixes that aged past the raw window; returns rows deleted."""
+        cutoff = int(now if now is not None else time.time()) - self.raw_seconds
+        deleted = 0
+        for user_id in self.db.location_users():
+            deleted += self.compact_user(user_id, cutoff)
+        self.stats['runs'] += 1
+        return deleted
+
+    def compact_user(self, user_id, cutoff):
+        start = self.db.get_compaction_watermark(user_id)
+        first = self.db.first_location_time(user_id, start)
+        deleted = 0
+        while first is not None:
+            day_start = first - first % 86400
+            day_end = day_start + 86400
+            if day_end > cutoff:
+                break  # Part of this day is still raw; it is compacted once all of it has aged out
+            rows = self.db.get_locations(user_id, day_start, day_end)
+            self.stats['scanned'] += len(rows)
+            points = [(lat, lon) for _, lat, lon, _ in rows]
+            anchor = self.db.location_before(user_id, day_start)
+            if anchor:
+                # The previous day's last kept fix starts the track, so a day that
+                # didn't move away from it needs none of its own fixes but the last
+                keep = douglas_peucker([tuple(anchor)] + points, self.epsilon_m)[1:]
+            else:
+                keep = douglas_peucker(points, self.epsilon_m)
+            drop = [row[0] for row, kept in zip(rows, keep) if not kept]
+            deleted += self.db.delete_locations(drop, user_id, day_end)
+            # Skip straight over days with no fixes
+            first = self.db.first_location_time(user_id, day_end)
+        self.stats['deleted'] += deleted
+        return deleted
+
+    def vacuum(self):
+        """Release free pages in steps so location writes interleave with the vacuum."""
+        while True:
+            released, remaining = self.db.incremental_vacuum(self.vacuum_step)
+            self.stats['vacuumed_pages'] += released
+            if not released or not remaining:
+                return
+            time.sleep(0.01)
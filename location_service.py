@@ -1,24 +1,137 @@
 import googlemaps
 import time
 import threading
-from datetime import datetime
+from concurrent.futures import Future
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class LocationCache:
+    """Process-wide per-user location fixes shared by every LocationService.
+
+    A fix younger than the caller's max_age is served from memory. Concurrent
+    misses for the same user share one lookup (single flight), and each
+    user's lookups are rate limited by their own token bucket, so one user's
+    tracking can't throttle another user's alert; a throttled caller gets the
+    last fix instead of a network call.
+    """
+
+    def __init__(self, ttl=20, rate=0.2, burst=3, wait_timeout=15):
+        self.ttl = ttl  # Default max age of a cached fix, in seconds
+        self.rate = rate
+        self.burst = burst
+        self.wait_timeout = wait_timeout
+        self.buckets = {}
+        self.entries = {}
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'deduplicated': 0, 'throttled': 0}
+
+    def get(self, user_id, fetch, max_age=None):
+        return self.get_fix(user_id, fetch, max_age)[0]
+
+    def get_fix(self, user_id, fetch, max_age=None):
+        """(location, fixed_at) for the user, or (None, None).
+
+        fixed_at is the monotonic time the fix was fetched. Cached and
+        throttled answers keep their original fixed_at, so a caller can tell
+        a repeat of an old fix from a new one.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and time.monotonic() - entry[1] <= max_age:
+                self.stats['hits'] += 1
+                return entry
+            flight = self.inflight.get(user_id)
+            owner = flight is None
+            if owner:
+                flight = self.inflight[user_id] = Future()
+                self.stats['misses'] += 1
+                bucket = self.buckets.get(user_id)
+                if bucket is None:
+                    bucket = self.buckets[user_id] = TokenBucket(self.rate, self.burst)
+            else:
+                self.stats['deduplicated'] += 1
+        if not owner:
+            try:
+                return flight.result(timeout=self.wait_timeout)
+            except Exception:
+                return entry or (None, None)
+
+        fix = entry or (None, None)
+        try:
+            location = None
+            if bucket.acquire():
+                location = fetch()
+            else:
+                self.stats['throttled'] += 1
+            if location:
+                fix = (location, time.monotonic())
+                with self.lock:
+                    self.entries[user_id] = fix
+        finally:
+            with self.lock:
+                self.inflight.pop(user_id, None)
+            flight.set_result(fix)
+        return fix
+
+
+_location_cache = LocationCache()
+
 
 class LocationService:
-    def __init__(self, db, user_id):
+    def __init__(self, db, user_id, cache=None):
         self.db = db
         self.user_id = user_id
         self.gmaps = googlemaps.Client(key='')  # Add your Google API key
+        self.cache = cache or _location_cache
         self.tracking = False
         self.tracking_thread = None
+        self.live_updates = None  # LiveUpdateScheduler fed by the tracking loop while location is shared
         self.update_interval = 30  # Update every 30 seconds
+        self.alert_max_age = 120  # Alerts accept a cached fix up to this old rather than wait on the network
+
+    def get_location(self, max_age=None):
+        """Current fix, served from the shared cache when one is younger than max_age seconds."""
+        return self.cache.get(self.user_id, self._geolocate, max_age)
+
+    def get_fix(self, max_age=None):
+        """Current fix and the monotonic time it was fetched; see LocationCache.get_fix."""
+        return self.cache.get_fix(self.user_id, self._geolocate, max_age)
 
-    def get_location(self):
+    def refresh_async(self):
+        """Warm the cache in the background so the alert path finds a fix in memory."""
+        thread = threading.Thread(target=self.get_location, kwargs={'max_age': 0})
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _geolocate(self):
         try:
             geolocation = self.gmaps.geolocate()
             if geolocation and 'location' in geolocation:
                 lat = geolocation['location']['lat']
                 lon = geolocation['location']['lng']
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                timestamp = int(time.time())
                 self.db.save_location(self.user_id, lat, lon, timestamp)
                 print(f"Current location retrieved: Lat {lat}, Lon {lon}")
                 return (lat, lon)
@@ -43,12 +156,12 @@ class LocationService:
             print(f"Error retrieving last location: {e}")
             return None
 
-    def start_live_tracking(self, callback):
+    def start_live_tracking(self, callback, interval_fn=None):
         if self.tracking:
             print("Live location tracking already running")
             return
         self.tracking = True
-        self.tracking_thread = threading.Thread(target=self._track_location, args=(callback,))
+        self.tracking_thread = threading.Thread(target=self._track_location, args=(callback, interval_fn))
         self.tracking_thread.daemon = True
         self.tracking_thread.start()
         print(f"Live location tracking started for user_id {self.user_id}")
@@ -58,11 +171,25 @@ class LocationService:
         if self.tracking_thread:
             self.tracking_thread.join(timeout=1)
             self.tracking_thread = None
+        updates, self.live_updates = self.live_updates, None
+        if updates:
+            updates.stop()
         print("Live location tracking stopped")
 
-    def _track_location(self, callback):
+    def _track_location(self, callback, interval_fn=None):
+        """Poll for fixes and pass each to `callback(location, fixed_at)`.
+
+        fixed_at is None for the last known location from the database, and
+        a cached or throttled fix keeps the time it was first fetched, so the
+        callback can tell which fixes are new.
+        """
         while self.tracking:
-            location = self.get_location() or self.get_last_location()
+            # interval_fn lets the caller adapt the polling rate, e.g. to movement speed
+            interval = interval_fn() if interval_fn else self.update_interval
+            # A cached fix may be up to half an interval old, so every poll sees a newer one
+            location, fixed_at = self.get_fix(max_age=interval / 2)
+            if not location:
+                location, fixed_at = self.get_last_location(), None
             if location:
-                callback(location)
-            time.sleep(self.update_interval)
\ No newline at end of file
+                callback(location, fixed_at)
+            time.sleep(interval)
\ No newline at end of file
@@ -3,15 +3,16 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
 from kivy.uix.label import Label
-from backend.messaging_service import MessagingService
 from kivy.utils import get_color_from_hex
 import sqlite3
+import threading
+from backend.command_detector import prepare_command_models
 
 class LoginScreen(Screen):
-    def __init__(self, db, **kwargs):
+    def __init__(self, db, messaging, **kwargs):
         super().__init__(**kwargs)
         self.db = db
-        self.messaging = MessagingService()
+        self.messaging = messaging
 
         layout = BoxLayout(orientation='vertical', padding=40, spacing=20)
         layout.size_hint = (0.9, 0.9)
@@ -127,6 +128,10 @@ class LoginScreen(Screen):
             self.manager.current = 'voice'
             voice_screen = self.manager.get_screen('voice')
             voice_screen.user_id = user[0]  # user[0] is the user id
+            # Warm the guardian cache so an alert never has to read them from SQLite
+            self.db.load_guardians(user[0])
+            # Build the command models off the UI thread so the listener finds them ready
+            threading.Thread(target=prepare_command_models, args=(self.db, user[0]), daemon=True).start()
             print(f"Login successful: User ID {user[0]}")
         else:
             self.error_label.text = "User not found"
@@ -6,19 +6,37 @@ from frontend.voice_screen import VoiceScreen
 from frontend.guardian_screen import GuardianScreen
 from frontend.main_screen import MainScreen
 from backend.database import Database
+from backend.messaging_service import MessagingService
+from backend.alert_dispatcher import AlertDispatcher
+from backend.location_retention import LocationRetention
 
 
 class VoiceGuardianApp(App):
     def build(self):
         self.db = Database()
+        # One messaging service (and pooled Twilio HTTP session) shared by every screen
+        self.messaging = MessagingService()
+        # Alerts go through the durable outbox so failed sends are retried, even across restarts
+        self.dispatcher = AlertDispatcher(self.db, self.messaging)
+        self.messaging.outbox = self.dispatcher
+        self.dispatcher.start()
+        # Compacts old location history so the table stays small over months of tracking
+        self.retention = LocationRetention(self.db)
+        self.retention.start()
         sm = ScreenManager()
-        sm.add_widget(LoginScreen(name='login', db=self.db))
-        sm.add_widget(SignupScreen(name='signup', db=self.db))
+        sm.add_widget(LoginScreen(name='login', db=self.db, messaging=self.messaging))
+        sm.add_widget(SignupScreen(name='signup', db=self.db, messaging=self.messaging))
         sm.add_widget(VoiceScreen(name='voice', db=self.db))
-        sm.add_widget(GuardianScreen(name='guardian', db=self.db))
-        sm.add_widget(MainScreen(name='main', db=self.db))
+        sm.add_widget(GuardianScreen(name='guardian', db=self.db, messaging=self.messaging))
+        sm.add_widget(MainScreen(name='main', db=self.db, messaging=self.messaging))
         return sm
 
+    def on_stop(self):
+        self.dispatcher.stop()
+        self.retention.stop()
+        # Flushes buffered location fixes before the connections close
+        self.db.close()
+
 
 if __name__ == '__main__':
     VoiceGuardianApp().run()
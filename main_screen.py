@@ -3,17 +3,16 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from backend.audio_monitor import AudioMonitor
-from backend.messaging_service import MessagingService
 from backend.command_detector import CommandDetector
 from kivy.utils import get_color_from_hex
 
 class MainScreen(Screen):
-    def __init__(self, db, **kwargs):
+    def __init__(self, db, messaging, **kwargs):
         super().__init__(**kwargs)
         self.db = db
         self.user_id = None
-        self.monitor = AudioMonitor(self.user_id, self.db, self)
-        self.messaging = MessagingService()
+        self.messaging = messaging
+        self.monitor = AudioMonitor(self.user_id, self.db, self, messaging=self.messaging)
         self.command_detector = None
         self.monitoring_active = False
 
@@ -81,13 +80,23 @@ class MainScreen(Screen):
         self.status_label.text = f"User ID: {self.user_id}. Ready." if self.user_id else "Welcome to VoiceGuardian"
         print("Stop Location Sharing button hidden")
 
+    def show_command_status(self, message):
+        """Say whether the spoken trigger is active, on its fallback, or off."""
+        self.status_label.text = message
+        print(f"Command status shown: {message}")
+
     def on_enter(self):
         print(f"Entered MainScreen, user_id: {self.user_id}")
         if self.user_id:
             self.status_label.text = f"User ID: {self.user_id}. Ready."
             self.monitor.user_id = self.user_id
+            self.monitor.location.user_id = self.user_id
+            self.monitor.location.refresh_async()
             if not self.command_detector:
-                self.command_detector = CommandDetector(self.messaging, self.db, self.user_id, self)
+                self.command_detector = CommandDetector(self.messaging, self.db, self.user_id, self,
+                                                        location=self.monitor.location)
+            if not self.command_detector.running:
+                # Also retries a detector that stopped because the user had no trigger recordings yet
                 self.command_detector.start_listening()
         else:
             self.status_label.text = "Error: User ID not set"
@@ -1,24 +1,138 @@
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from requests.adapters import HTTPAdapter
+from backend.live_updates import LiveUpdateScheduler
+from concurrent.futures import ThreadPoolExecutor, wait
+import itertools
+import uuid
 import random
 import time
 import threading
 
+class StubClient:
+    """Offline stand-in for the Twilio Client; records messages instead of sending them."""
+
+    def __init__(self, latency=0.0, fail_numbers=(), fail_times=1):
+        self.messages = _StubMessages(latency, set(fail_numbers), fail_times)
+
+
+class _StubMessages:
+    def __init__(self, latency, fail_numbers, fail_times):
+        self.latency = latency
+        self.fail_numbers = fail_numbers
+        self.fail_times = fail_times
+        self.sent = []
+        self.attempts = {}
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def create(self, body, from_, to):
+        time.sleep(self.latency)
+        with self.lock:
+            self.attempts[to] = self.attempts.get(to, 0) + 1
+            # Numbers in fail_numbers fail their first fail_times attempts (-1 = always)
+            if to in self.fail_numbers and (self.fail_times < 0 or self.attempts[to] <= self.fail_times):
+                raise RuntimeError(f"Stub failure sending to {to}")
+            self.sent.append({'to': to, 'from_': from_, 'body': body})
+            return _StubMessage(f"SM{next(self._ids):032d}")
+
+
+class _StubMessage:
+    def __init__(self, sid):
+        self.sid = sid
+
+
 class MessagingService:
-    def __init__(self):
+    def __init__(self, client=None, max_workers=8, send_timeout=10, retries=2, backoff=0.5):
         self.account_sid = "" # Add your Twilio SID
         self.auth_token = "" # Add your Twilio Auth Token
         self.twilio_number = "" # Add your Twilio Phone Number
-        try:
-            self.client = Client(self.account_sid, self.auth_token)
-            print("Twilio client initialized")
-        except Exception as e:
-            print(f"Failed to initialize Twilio client: {e}")
-            raise
+        self.send_timeout = send_timeout  # Seconds per HTTP request to Twilio
+        self.retries = retries  # Extra attempts per recipient after a failure
+        self.backoff = backoff  # Base delay in seconds, doubled per attempt and jittered
+        self.live_sharing_seconds = 300  # Live location is shared for 5 minutes after the latest alert
+        self.live_update_max_age = 120  # A queued live update older than this is superseded by newer fixes
+        if client is not None:
+            self.client = client
+        else:
+            try:
+                # One keep-alive session, with a connection pool sized for the fan-out workers
+                http_client = TwilioHttpClient(pool_connections=True, timeout=self.send_timeout)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+                http_client.session.mount('https://', adapter)
+                self.client = Client(self.account_sid, self.auth_token, http_client=http_client)
+                print("Twilio client initialized")
+            except Exception as e:
+                print(f"Failed to initialize Twilio client: {e}")
+                raise
+        # Recipients are sent to in parallel, so a fan-out costs about one round trip
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sms")
         self.otp_store = {}
+        # Optional AlertDispatcher; when set, alerts are persisted and retried from the outbox
+        self.outbox = None
 
-    def send_otp(self, number):
+    def normalize_number(self, number):
         if not number.startswith('+91'):
             number = '+91' + number
+        return number
+
+    def _send_with_retry(self, number, body, retries=None):
+        retries = self.retries if retries is None else retries
+        started = time.monotonic()
+        result = {'to': number, 'ok': False, 'sid': None, 'attempts': 0, 'error': None}
+        for attempt in range(retries + 1):
+            result['attempts'] = attempt + 1
+            try:
+                message = self.client.messages.create(body=body, from_=self.twilio_number, to=number)
+                result['ok'] = True
+                result['sid'] = message.sid
+                result['error'] = None
+                break
+            except Exception as e:
+                result['error'] = str(e)
+                if attempt < retries:
+                    # Exponential backoff with full jitter so retries don't arrive in lockstep
+                    time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+        result['elapsed'] = time.monotonic() - started
+        return result
+
+    def send_many(self, messages, retries=None):
+        """Send (number, body) pairs concurrently; results come back in input order."""
+        started = time.monotonic()
+        retries = self.retries if retries is None else retries
+        futures = [self.executor.submit(self._send_with_retry, self.normalize_number(number), body, retries)
+                   for number, body in messages]
+        # Worst case per recipient: every attempt times out plus the backoff sleeps
+        deadline = (retries + 1) * self.send_timeout + self.backoff * (2 ** (retries + 1))
+        wait(futures, timeout=deadline)
+        results = []
+        for future, (number, _) in zip(futures, messages):
+            if future.done():
+                results.append(future.result())
+            else:
+                results.append({'to': self.normalize_number(number), 'ok': False, 'sid': None, 'attempts': None,
+                                'error': 'timed out', 'elapsed': deadline})
+        sent = sum(1 for r in results if r['ok'])
+        summary = {'sent': sent, 'failed': len(results) - sent, 'results': results,
+                   'elapsed': time.monotonic() - started}
+        return summary
+
+    def send_bulk(self, to_numbers, body):
+        """Send `body` to every number concurrently and return a summary of the results."""
+        return self.send_many([(number, body) for number in to_numbers])
+
+    def _dispatch(self, to_numbers, body, key, max_age=None):
+        """Queue through the durable outbox when one is attached, otherwise send right away.
+
+        Queued messages not sent within `max_age` seconds are dropped (the outbox default if None).
+        """
+        if self.outbox:
+            queued = self.outbox.enqueue(key, to_numbers, body, max_age)
+            return {'queued': queued, 'sent': 0, 'failed': 0, 'results': [], 'elapsed': 0.0}
+        return self.send_bulk(to_numbers, body)
+
+    def send_otp(self, number):
+        number = self.normalize_number(number)
         otp = str(random.randint(100000, 999999))
         self.otp_store[number] = otp
         try:
@@ -32,8 +146,7 @@ class MessagingService:
             print(f"Failed to send OTP to {number}: {e}")
 
     def verify_otp(self, number, otp):
-        if not number.startswith('+91'):
-            number = '+91' + number
+        number = self.normalize_number(number)
         result = self.otp_store.get(number) == otp
         print(f"OTP verification for {number}: {otp} -> {result}")
         return result
@@ -47,18 +160,17 @@ class MessagingService:
         if location and isinstance(location, tuple):
             lat, lon = location
             maps_url = f"https://www.google.com/maps?q={lat},{lon}"
-        for number in to_numbers:
-            if not number.startswith('+91'):
-                number = '+91' + number
-            try:
-                message = self.client.messages.create(
-                    body=f"EMERGENCY ALERT! View location: {maps_url}",
-                    from_=self.twilio_number,
-                    to=number
-                )
-                print(f"Alert sent to {number}: SID {message.sid}, Maps URL: {maps_url}")
-            except Exception as e:
-                print(f"Failed to send alert to {number}: {e}")
+        alert_id = uuid.uuid4().hex
+        summary = self._dispatch(to_numbers, f"EMERGENCY ALERT! View location: {maps_url}", alert_id)
+        if 'queued' in summary:
+            print(f"Alert {alert_id} queued for {summary['queued']} recipients")
+        for result in summary['results']:
+            if result['ok']:
+                print(f"Alert sent to {result['to']}: SID {result['sid']}, Maps URL: {maps_url}")
+            else:
+                print(f"Failed to send alert to {result['to']} after {result['attempts']} attempts: {result['error']}")
+        if summary['results']:
+            print(f"Alert fan-out: {summary['sent']} sent, {summary['failed']} failed in {summary['elapsed']:.2f}s")
 
         # Show Stop Location Sharing button on MainScreen
         if main_screen:
@@ -66,29 +178,39 @@ class MessagingService:
 
         # Start live location updates if location_service is provided
         if location_service:
-            def location_callback(location):
-                maps_url = "Location unavailable"
-                if location and isinstance(location, tuple):
-                    lat, lon = location
-                    maps_url = f"https://www.google.com/maps?q={lat},{lon}"
-                for number in to_numbers:
-                    if not number.startswith('+91'):
-                        number = '+91' + number
-                    try:
-                        message = self.client.messages.create(
-                            body=f"Live Location Update: View location: {maps_url}",
-                            from_=self.twilio_number,
-                            to=number
-                        )
-                        print(f"Live update sent to {number}: SID {message.sid}, Maps URL: {maps_url}")
-                    except Exception as e:
-                        print(f"Failed to send live update to {number}: {e}")
-            
-            location_service.start_live_tracking(location_callback)
-            # Stop tracking after 5 minutes
+            updates = location_service.live_updates
+            if updates is not None and location_service.tracking:
+                # Already sharing for an earlier alert: keep feeding that scheduler, for the full window from now
+                updates.stop_at = time.monotonic() + self.live_sharing_seconds
+                print("Live location sharing already active; extended for this alert")
+                return summary
+            update_count = itertools.count(1)
+
+            def send_update(location):
+                lat, lon = location
+                maps_url = f"https://www.google.com/maps?q={lat},{lon}"
+                update = self._dispatch(to_numbers, f"Live Location Update: View location: {maps_url}",
+                                        f"{alert_id}:update{next(update_count)}", self.live_update_max_age)
+                for result in update['results']:
+                    if result['ok']:
+                        print(f"Live update sent to {result['to']}: SID {result['sid']}, Maps URL: {maps_url}")
+                    else:
+                        print(f"Failed to send live update to {result['to']}: {result['error']}")
+
+            # Only fixes that moved far enough are sent, and bursts collapse to the latest one
+            updates = LiveUpdateScheduler(send_update)
+            updates.stop_at = time.monotonic() + self.live_sharing_seconds
+            updates.start(location if isinstance(location, tuple) else None)
+            # The service owns the scheduler from here, so stop_live_tracking stops both
+            location_service.live_updates = updates
+            location_service.start_live_tracking(updates.submit, updates.next_interval)
+            # Stop sharing at the deadline, unless the user stopped it first
             def stop_tracking():
-                time.sleep(300)  # 5 minutes
-                location_service.stop_live_tracking()
-                if main_screen:
-                    main_screen.hide_stop_button()
-            threading.Thread(target=stop_tracking, daemon=True).start()
\ No newline at end of file
+                while location_service.live_updates is updates and time.monotonic() < updates.stop_at:
+                    time.sleep(1)
+                if location_service.live_updates is updates:
+                    location_service.stop_live_tracking()
+                    if main_screen:
+                        main_screen.hide_stop_button()
+            threading.Thread(target=stop_tracking, daemon=True).start()
+        return summary
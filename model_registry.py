@@ -0,0 +1,31 @@
+import threading
+import numpy as np
+from backend.inference_backend import load_backend
+
+# Process-wide cache of loaded inference backends, keyed by (backend, path)
+_models = {}
+_lock = threading.Lock()
+
+def get_model(path, backend='keras'):
+    """Return the shared backend for `path`, loading and warming it up on first use."""
+    key = (backend, path)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            model = load_backend(backend, path)
+            warm_up(model)
+            _models[key] = model
+            print(f"Model loaded into registry: {path} ({backend})")
+    return model
+
+def warm_up(model):
+    # One dummy prediction builds and traces the predict function up front
+    dummy = np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32)
+    model.predict(dummy)
+
+def clear():
+    with _lock:
+        _models.clear()
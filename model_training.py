@@ -1,4 +1,8 @@
 import os
+import sys
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import librosa
 import tensorflow as tf
@@ -8,47 +12,153 @@ from sklearn.utils.class_weight import compute_class_weight
 from sklearn.svm import SVC
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, classification_report
+from backend.inference_backend import TFLiteBackend
+from backend.scream_detector import DECISION_THRESHOLD
+from backend import feature_extractor
 
 # Paths to your dataset
 NON_SCREAMING_PATH = r"D:\Project_HSD\archive\NotScreaming"
 SCREAMING_PATH = r"D:\Project_HSD\archive\Screaming"
 MODEL_PATH = r"data\scream_model.h5"
+TFLITE_MODEL_PATH = r"data\scream_model.tflite"
+TFLITE_QUANTIZATION = 'float16'  # None, 'float16' or 'int8'
 
 # Parameters
-SAMPLE_RATE = 44100
+SAMPLE_RATE = feature_extractor.SAMPLE_RATE
 DURATION = 5  # Assuming 5-second clips; adjust as needed
-N_MFCC = 20
-MAX_TIME_STEPS = 862  # Adjust based on your longest audio file after MFCC extraction
-
-def load_audio_files(path, label):
-    audio_data = []
-    labels = []
-    for filename in os.listdir(path):
-        if filename.endswith('.wav'):
-            file_path = os.path.join(path, filename)
-            try:
-                y, sr = librosa.load(file_path, sr=SAMPLE_RATE, duration=DURATION)
-                mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=N_MFCC)
-                # Pad or truncate to fixed length
-                if mfcc.shape[1] < MAX_TIME_STEPS:
-                    mfcc = np.pad(mfcc, ((0, 0), (0, MAX_TIME_STEPS - mfcc.shape[1])), mode='constant')
-                else:
-                    mfcc = mfcc[:, :MAX_TIME_STEPS]
-                audio_data.append(mfcc)
-                labels.append(label)
-            except Exception as e:
-                print(f"Error loading {file_path}: {e}")
-    return audio_data, labels
+N_MFCC = feature_extractor.N_MFCC
+MAX_TIME_STEPS = feature_extractor.MAX_TIME_STEPS  # Adjust based on your longest audio file after MFCC extraction
+# Clips featurized together as one stacked array; each 5 s clip costs ~19 MB at peak, so 8 stay near 150 MB per worker
+FEATURE_BATCH_SIZE = 8
+FEATURE_CACHE_DIR = os.path.join("data", "feature_cache")
+# Featurization processes, e.g. FEATURE_WORKERS=8; peak memory is about workers x 150 MB
+FEATURE_WORKERS = int(os.environ.get('FEATURE_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Streaming (tf.data) training: memory stays bounded by these buffers, not the corpus size
+STREAM_BATCH_SIZE = 32
+STREAM_SHUFFLE_BUFFER = 10000  # File paths, not audio, so this stays small in memory
+# No random gain: the extractor peak-normalises every clip, so it would cancel out
+AUGMENT_NOISE_LEVEL = 0.005  # Max std of added white noise, relative to the clip's peak
+AUGMENT_MAX_SHIFT = 0.5  # Max time shift in seconds, either direction
+
+# Same extractor the app uses at inference time, so features cannot drift apart
+extractor = feature_extractor.MFCCExtractor(sr=SAMPLE_RATE, n_mfcc=N_MFCC, max_time_steps=MAX_TIME_STEPS)
+
+def list_audio_files(path, label):
+    file_paths = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.wav'))
+    return file_paths, [label] * len(file_paths)
+
+def feature_cache_path(file_path):
+    # Keyed by file identity and every parameter that changes the features
+    stat = os.stat(file_path)
+    key = json.dumps({'path': os.path.abspath(file_path), 'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+                      'duration': DURATION, **extractor.params}, sort_keys=True)
+    return os.path.join(FEATURE_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + '.npy')
+
+def save_atomic(path, array):
+    """np.save via a partial file and a rename, so an interrupted run never leaves a truncated entry."""
+    partial = path[:-len('.npy')] + '.partial.npy'
+    np.save(partial, array)
+    os.replace(partial, path)
+
+def featurize_files(jobs):
+    """Worker: decode and featurize (file_path, cache_path) pairs, writing each to its cache file."""
+    done = []
+    clips = []
+    for file_path, cache_path in jobs:
+        try:
+            y, sr = librosa.load(file_path, sr=SAMPLE_RATE, duration=DURATION)
+            clips.append((cache_path, y))
+        except Exception as e:
+            print(f"Error loading {file_path}: {e}")
+    if clips:
+        features = extractor.extract_batch([y for _, y in clips])
+        for (cache_path, _), mfcc in zip(clips, features):
+            save_atomic(cache_path, mfcc)
+            done.append(cache_path)
+    return done
+
+def prune_feature_cache(keep):
+    """Delete every cache file not named in `keep`: superseded matrices, removed clips, partial writes."""
+    removed = 0
+    for name in os.listdir(FEATURE_CACHE_DIR):
+        if name in keep:
+            continue
+        try:
+            os.remove(os.path.join(FEATURE_CACHE_DIR, name))
+            removed += 1
+        except OSError as e:
+            print(f"Error pruning feature cache entry {name}: {e}")
+    if removed:
+        print(f"Pruned {removed} stale feature cache entries")
+
+def load_features(file_paths):
+    """Return (X, ok) with features for every file that could be featurized.
+
+    Only files missing from the on-disk cache are decoded, in parallel across
+    FEATURE_WORKERS processes. X is a read-only memory map of the assembled
+    matrix, itself cached under a key built from the per-file keys. The
+    matrix is only kept as a cache entry when every file featurized, so
+    files that failed are retried next run; entries for anything else
+    are pruned.
+    """
+    os.makedirs(FEATURE_CACHE_DIR, exist_ok=True)
+    cache_paths = [feature_cache_path(f) for f in file_paths]
+    matrix_key = hashlib.sha1('\n'.join(cache_paths).encode()).hexdigest()
+    matrix_path = os.path.join(FEATURE_CACHE_DIR, f"dataset_{matrix_key}.npy")
+    index_path = os.path.join(FEATURE_CACHE_DIR, f"dataset_{matrix_key}.index.npy")
+    keep = {os.path.basename(c) for c in cache_paths} | {os.path.basename(matrix_path), os.path.basename(index_path)}
+    if os.path.exists(matrix_path) and os.path.exists(index_path):
+        print(f"Using cached feature matrix {matrix_path}")
+        prune_feature_cache(keep)
+        return np.load(matrix_path, mmap_mode='r'), np.load(index_path)
+
+    # An index without its matrix is from an earlier build; it must not describe this one
+    try:
+        os.remove(index_path)
+    except FileNotFoundError:
+        pass
+
+    missing = [(f, c) for f, c in zip(file_paths, cache_paths) if not os.path.exists(c)]
+    print(f"Featurizing {len(missing)} new or changed files ({len(file_paths) - len(missing)} cached)")
+    if missing:
+        batches = [missing[i:i + FEATURE_BATCH_SIZE] for i in range(0, len(missing), FEATURE_BATCH_SIZE)]
+        with ProcessPoolExecutor(max_workers=FEATURE_WORKERS) as pool:
+            for _ in pool.map(featurize_files, batches):
+                pass
+
+    ok = np.array([os.path.exists(c) for c in cache_paths], dtype=bool)
+    partial_path = matrix_path[:-len('.npy')] + '.partial.npy'
+    X = np.lib.format.open_memmap(partial_path, mode='w+', dtype=np.float32,
+                                  shape=(int(ok.sum()), N_MFCC, MAX_TIME_STEPS))
+    for row, cache_path in enumerate(c for c, keep_row in zip(cache_paths, ok) if keep_row):
+        X[row] = np.load(cache_path, mmap_mode='r')
+    X.flush()
+    del X
+    os.replace(partial_path, matrix_path)
+    if ok.all():
+        # The index marks the matrix complete; without it the next run rebuilds and retries failures
+        save_atomic(index_path, ok)
+    else:
+        print(f"{int((~ok).sum())} files failed to featurize; the feature matrix is not cached")
+    prune_feature_cache(keep)
+    return np.load(matrix_path, mmap_mode='r'), ok
+
+_dataset = None
+
+def load_dataset():
+    """Feature matrix and labels for the whole corpus, built once per run and shared by both trainers."""
+    global _dataset
+    if _dataset is None:
+        scream_files, scream_labels = list_audio_files(SCREAMING_PATH, 1)
+        non_scream_files, non_scream_labels = list_audio_files(NON_SCREAMING_PATH, 0)
+        X, ok = load_features(scream_files + non_scream_files)
+        y = np.array(scream_labels + non_scream_labels)[ok]
+        _dataset = (X, y)
+    return _dataset
 
 def prepare_data(use_cnn=True):
-    # Load screaming data
-    scream_data, scream_labels = load_audio_files(SCREAMING_PATH, 1)
-    # Load non-screaming data
-    non_scream_data, non_scream_labels = load_audio_files(NON_SCREAMING_PATH, 0)
-    
-    # Combine datasets
-    X = np.array(scream_data + non_scream_data)
-    y = np.array(scream_labels + non_scream_labels)
+    X, y = load_dataset()
     
      # Split into train and test sets
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -91,7 +201,45 @@ def build_cnn_model():
     model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
     return model
 
-def train_cnn_model():
+def export_tflite(model, path=TFLITE_MODEL_PATH, quantization=TFLITE_QUANTIZATION, representative_data=None):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if representative_data is None:
+            raise ValueError("int8 quantization needs representative_data to calibrate activations")
+        def representative_dataset():
+            for sample in representative_data[:200]:
+                yield [sample[np.newaxis].astype(np.float32)]
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    elif quantization is not None:
+        raise ValueError(f"Unknown quantization '{quantization}'")
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    print(f"TFLite model ({quantization or 'float32'}) saved to {path}")
+    return path
+
+def check_tflite_parity(model, tflite_path, X, threshold=DECISION_THRESHOLD, tolerance=0.05):
+    """Compare TFLite probabilities against the Keras model on the same inputs.
+
+    Decision agreement is measured at `threshold`, by default the one ScreamDetector serves with.
+    """
+    keras_probs = model.predict(X, verbose=0)[:, 0]
+    tflite = TFLiteBackend(tflite_path)
+    tflite_probs = np.concatenate([tflite.predict(X[i:i + 32]) for i in range(0, len(X), 32)])
+    max_diff = float(np.max(np.abs(keras_probs - tflite_probs)))
+    agreement = float(np.mean((keras_probs > threshold) == (tflite_probs > threshold)))
+    print(f"TFLite parity: max |diff|={max_diff:.4f}, decision agreement={agreement * 100:.2f}% at threshold {threshold}")
+    if max_diff > tolerance:
+        print(f"Warning: TFLite output differs from Keras by more than {tolerance}")
+    return max_diff, agreement
+
+def train_cnn_model(export_quantization=TFLITE_QUANTIZATION):
     X_train, X_test, y_train, y_test, _ = prepare_data(use_cnn=True)
     
     model = build_cnn_model()
@@ -110,9 +258,73 @@ def train_cnn_model():
     # Save the model
     model.save(MODEL_PATH)
     print(f"CNN Model saved to {MODEL_PATH}")
+
+    if export_quantization:
+        export_tflite(model, quantization=export_quantization, representative_data=X_train)
+        check_tflite_parity(model, TFLITE_MODEL_PATH, X_test)
     
     return model, history
 
+def augment_clip(y, rng):
+    """Random time shift and background noise, applied on the fly to one training clip."""
+    shift = int(rng.uniform(-AUGMENT_MAX_SHIFT, AUGMENT_MAX_SHIFT) * SAMPLE_RATE)
+    if shift > 0:
+        y = np.concatenate((np.zeros(shift, dtype=y.dtype), y[:-shift]))
+    elif shift < 0:
+        y = np.concatenate((y[-shift:], np.zeros(-shift, dtype=y.dtype)))
+    # Scaled to the clip so the SNR survives normalisation; left unclipped, since features are peak-normalised
+    peak = np.abs(y).max() if len(y) else 0.0
+    noise = rng.standard_normal(len(y)).astype(y.dtype) * np.float32(rng.uniform(0, AUGMENT_NOISE_LEVEL) * peak)
+    return y + noise
+
+def load_clip_features(file_path, augment):
+    y, sr = librosa.load(file_path.decode() if isinstance(file_path, bytes) else file_path,
+                         sr=SAMPLE_RATE, duration=DURATION)
+    if augment:
+        y = augment_clip(y, np.random.default_rng())
+    return extractor.extract(y).astype(np.float32)[..., np.newaxis]
+
+def make_streaming_dataset(file_paths, labels, training):
+    """tf.data pipeline that decodes, augments and featurizes clips in parallel as batches are consumed."""
+    ds = tf.data.Dataset.from_tensor_slices((file_paths, np.asarray(labels, dtype=np.float32)))
+    if training:
+        ds = ds.shuffle(min(len(file_paths), STREAM_SHUFFLE_BUFFER), reshuffle_each_iteration=True)
+
+    def load(path, label):
+        features = tf.numpy_function(load_clip_features, [path, training], tf.float32)
+        features.set_shape((N_MFCC, MAX_TIME_STEPS, 1))
+        return features, label
+
+    ds = ds.map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    # Skip clips that fail to decode instead of aborting the epoch
+    ds = ds.apply(tf.data.experimental.ignore_errors())
+    return ds.batch(STREAM_BATCH_SIZE).prefetch(tf.data.AUTOTUNE)
+
+def train_cnn_model_streaming(epochs=20, export_quantization=TFLITE_QUANTIZATION):
+    scream_files, scream_labels = list_audio_files(SCREAMING_PATH, 1)
+    non_scream_files, non_scream_labels = list_audio_files(NON_SCREAMING_PATH, 0)
+    files_train, files_test, y_train, y_test = train_test_split(
+        scream_files + non_scream_files, scream_labels + non_scream_labels, test_size=0.2, random_state=42)
+    train_ds = make_streaming_dataset(files_train, y_train, training=True)
+    test_ds = make_streaming_dataset(files_test, y_test, training=False)
+
+    model = build_cnn_model()
+    model.summary()
+    history = model.fit(train_ds, epochs=epochs, validation_data=test_ds)
+
+    loss, accuracy = model.evaluate(test_ds)
+    print(f"CNN (streaming) Test Accuracy: {accuracy * 100:.2f}%")
+    model.save(MODEL_PATH)
+    print(f"CNN Model saved to {MODEL_PATH}")
+
+    if export_quantization:
+        # A few batches are enough to calibrate and check the exported model
+        X_sample = np.concatenate([x.numpy() for x, _ in test_ds.take(8)])
+        export_tflite(model, quantization=export_quantization, representative_data=X_sample)
+        check_tflite_parity(model, TFLITE_MODEL_PATH, X_sample)
+
+    return model, history
+
 def train_svm_model():
     X_train, X_test, y_train, y_test, class_weight_dict = prepare_data(use_cnn=False)
     
@@ -133,6 +345,12 @@ def train_svm_model():
     return svm_model
 
 if __name__ == '__main__':
+    # Run from the project root: python -m backend.model_training [--streaming]
+    if '--streaming' in sys.argv:
+        # Large corpora: stream clips through tf.data instead of loading every feature into RAM
+        cnn_model, cnn_history = train_cnn_model_streaming()
+        sys.exit(0)
+
     # Train and evaluate CNN
     cnn_model, cnn_history = train_cnn_model()
     
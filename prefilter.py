@@ -0,0 +1,145 @@
+import numpy as np
+
+class PreFilterCascade:
+    """Cheap staged gate that decides whether a chunk is worth a CNN pass.
+
+    Stages run in order and stop at the first rejection:
+      1. energy   - peak amplitude, and optionally RMS level in dBFS
+      2. spectral - spectral centroid, share of energy above `high_band_hz`
+                    and autocorrelation pitch strength in the scream range
+      3. linear   - logistic score over the same features
+    Only the energy stage is on by default, matching the old amplitude check.
+    The spectral and linear settings below are untuned starting points; a
+    gate that drops real screams fails silently, so enable those stages via
+    `stages` only once they are fitted (`fit_linear`) and checked against
+    `pass_rates()` on real recordings.
+    """
+
+    STAGES = ('energy', 'spectral', 'linear')
+    DEFAULTS = {
+        'stages': ('energy',),
+        'min_peak': 50,  # int16 scale after gain, as in the original check
+        'min_rms_db': None,  # e.g. -35.0; None disables the RMS check
+        'min_centroid_hz': 1000.0,
+        'high_band_hz': 2000.0,
+        'min_high_band_ratio': 0.15,
+        'min_pitch_hz': 250.0,
+        'max_pitch_hz': 3000.0,
+        'min_pitch_strength': 0.3,
+        # Weights over [rms_db / 10, centroid_khz, high_band_ratio, pitch_strength]
+        'linear_weights': (0.5, 0.6, 3.0, 3.0),
+        'linear_bias': -2.5,
+        'linear_threshold': 0.5,
+    }
+
+    def __init__(self, sr=44100, **config):
+        unknown = set(config) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown prefilter settings: {sorted(unknown)}")
+        self.sr = sr
+        self.config = dict(self.DEFAULTS, **config)
+        unknown = set(self.config['stages']) - set(self.STAGES)
+        if unknown:
+            raise ValueError(f"Unknown prefilter stages: {sorted(unknown)}, expected some of {self.STAGES}")
+        self._window_cache = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {stage: {'seen': 0, 'passed': 0} for stage in self.STAGES}
+
+    def pass_rates(self):
+        return {stage: (counts['passed'] / counts['seen'] if counts['seen'] else 0.0)
+                for stage, counts in self.stats.items()}
+
+    def rms_db(self, x):
+        rms = np.sqrt(np.mean(x * x)) if x.size else 0.0
+        return 20 * np.log10(max(rms, 1e-10))
+
+    def spectral_features(self, x):
+        n = len(x)
+        window = self._window_cache.get(n)
+        if window is None:
+            window = self._window_cache[n] = np.hanning(n).astype(np.float32)
+        power = np.abs(np.fft.rfft(x * window)) ** 2
+        freqs = np.fft.rfftfreq(n, 1.0 / self.sr)
+        total = power.sum()
+        if total <= 0:
+            return 0.0, 0.0, 0.0
+        centroid = float((freqs * power).sum() / total)
+        high_band_ratio = float(power[freqs >= self.config['high_band_hz']].sum() / total)
+        # Autocorrelation from the power spectrum; the normalised peak in the
+        # pitch lag range says how periodic (voiced) the chunk is. Searching only
+        # past the first zero crossing keeps low hum from scoring at tiny lags.
+        autocorr = np.fft.irfft(power)
+        max_lag = min(len(autocorr) // 2, int(self.sr / self.config['min_pitch_hz']))
+        below_zero = np.flatnonzero(autocorr[1:max_lag] < 0)
+        min_lag = max(1, int(self.sr / self.config['max_pitch_hz']), below_zero[0] + 1 if below_zero.size else max_lag)
+        pitch_strength = float(max(0.0, autocorr[min_lag:max_lag].max() / autocorr[0])) if max_lag > min_lag else 0.0
+        return centroid, high_band_ratio, pitch_strength
+
+    def features(self, audio_data):
+        x = np.asarray(audio_data, dtype=np.float32) / 32768.0
+        return (self.rms_db(x),) + self.spectral_features(x)
+
+    def linear_score(self, features):
+        rms_db, centroid, high_band_ratio, pitch_strength = features
+        z = np.dot(self.config['linear_weights'],
+                   (rms_db / 10.0, centroid / 1000.0, high_band_ratio, pitch_strength)) + self.config['linear_bias']
+        return float(1.0 / (1.0 + np.exp(-z)))
+
+    def check(self, audio_data):
+        """Return True when the chunk (int16 scale, gain applied) passes every enabled stage."""
+        cfg = self.config
+        stages = cfg['stages']
+        x = np.asarray(audio_data, dtype=np.float32) / 32768.0
+
+        if 'energy' in stages:
+            self.stats['energy']['seen'] += 1
+            peak = float(np.max(np.abs(x))) * 32768.0 if x.size else 0.0
+            if peak <= cfg['min_peak']:
+                return False
+            if cfg['min_rms_db'] is not None and self.rms_db(x) < cfg['min_rms_db']:
+                return False
+            self.stats['energy']['passed'] += 1
+        if 'spectral' not in stages and 'linear' not in stages:
+            return True
+
+        rms_db = self.rms_db(x)
+        centroid, high_band_ratio, pitch_strength = self.spectral_features(x)
+        if 'spectral' in stages:
+            self.stats['spectral']['seen'] += 1
+            if (centroid < cfg['min_centroid_hz'] or high_band_ratio < cfg['min_high_band_ratio']
+                    or pitch_strength < cfg['min_pitch_strength']):
+                return False
+            self.stats['spectral']['passed'] += 1
+
+        score = None
+        if 'linear' in stages:
+            self.stats['linear']['seen'] += 1
+            score = self.linear_score((rms_db, centroid, high_band_ratio, pitch_strength))
+            if score < cfg['linear_threshold']:
+                return False
+            self.stats['linear']['passed'] += 1
+        print(f"Prefilter passed: rms={rms_db:.1f}dBFS, centroid={centroid:.0f}Hz, "
+              f"high_band={high_band_ratio:.2f}, pitch_strength={pitch_strength:.2f}"
+              + (f", score={score:.2f}" if score is not None else ""))
+        return True
+
+    def fit_linear(self, chunks, labels, epochs=500, learning_rate=0.1):
+        """Fit the linear stage by logistic regression on labelled chunks (1 = scream).
+
+        This only sets the weights; add 'linear' to `stages` once its pass
+        rates on held-out recordings look right.
+        """
+        X = np.array([self.features(chunk) for chunk in chunks], dtype=np.float64)
+        X = X / np.array([10.0, 1000.0, 1.0, 1.0])
+        y = np.asarray(labels, dtype=np.float64)
+        w = np.zeros(X.shape[1])
+        b = 0.0
+        for _ in range(epochs):
+            p = 1.0 / (1.0 + np.exp(-(X @ w + b)))
+            w -= learning_rate * X.T @ (p - y) / len(y)
+            b -= learning_rate * float(np.mean(p - y))
+        self.config['linear_weights'] = tuple(w)
+        self.config['linear_bias'] = b
+        return w, b
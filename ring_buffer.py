@@ -0,0 +1,53 @@
+import numpy as np
+
+class RingBuffer:
+    """Fixed-capacity FIFO over a preallocated NumPy array.
+
+    Items are rows along axis 0, so the same class holds raw samples
+    (shape ``(capacity,)``) or feature frames (``(capacity, n_features)``).
+    ``written`` counts every row ever written and never wraps.
+    """
+
+    def __init__(self, capacity, frame_shape=(), dtype=np.float32):
+        self.capacity = int(capacity)
+        self.buffer = np.zeros((self.capacity,) + tuple(frame_shape), dtype=dtype)
+        self.written = 0
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def write(self, items):
+        items = np.asarray(items, dtype=self.buffer.dtype)
+        n = len(items)
+        if n == 0:
+            return
+        if n >= self.capacity:
+            items = items[-self.capacity:]
+            self.written += n - self.capacity
+            n = self.capacity
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = items[:first]
+        if first < n:
+            self.buffer[:n - first] = items[first:]
+        self.written += n
+
+    def latest(self, n):
+        """Return the newest ``n`` rows in write order (a copy when the range wraps)."""
+        n = min(int(n), len(self))
+        return self.read(self.written - n, n)
+
+    def read(self, start, n):
+        """Return rows ``start`` .. ``start + n`` by absolute write index.
+
+        The result is a view into the buffer unless the range wraps, so it is
+        only valid until the writer laps it; the caller must have checked that
+        ``start >= written - capacity``.
+        """
+        offset = start % self.capacity
+        if offset + n <= self.capacity:
+            return self.buffer[offset:offset + n]
+        return np.concatenate((self.buffer[offset:], self.buffer[:offset + n - self.capacity]))
+
+    def clear(self):
+        self.written = 0
@@ -1,42 +1,76 @@
+import os
 import librosa
-import tensorflow as tf
 import numpy as np
+from backend import model_registry
+from backend.feature_extractor import MFCCExtractor
+
+MODEL_PATHS = {
+    'keras': 'data/scream_model.h5',
+    'tflite': 'data/scream_model.tflite',
+}
+# Inference backend chosen at startup, e.g. SCREAM_MODEL_BACKEND=tflite
+MODEL_BACKEND = os.environ.get('SCREAM_MODEL_BACKEND', 'keras')
+# Probability above which a clip counts as a scream; training-time checks use it too
+DECISION_THRESHOLD = 0.0 #0.3 # Lowered to 0.2 for smaller screams
 
 class ScreamDetector:
-    def __init__(self):
+    def __init__(self, backend=None):
+        backend = backend or MODEL_BACKEND
         try:
-            self.model = tf.keras.models.load_model('data/scream_model.h5')
-            print("Scream model loaded successfully")
+            self.model = model_registry.get_model(MODEL_PATHS[backend], backend)
+            print(f"Scream model loaded successfully ({backend})")
         except Exception as e:
             print(f"Failed to load scream model: {e}")
             raise
-        self.sample_rate = 44100
-        self.n_mfcc = 20
-        self.max_time_steps = 862
-        
+        self.features = MFCCExtractor()
+        self.sample_rate = self.features.sr
+        self.n_mfcc = self.features.n_mfcc
+        self.max_time_steps = self.features.max_time_steps
+        self.threshold = DECISION_THRESHOLD
+
+    def model_input(self, mfcc):
+        """Shape an (n_mfcc, frames) MFCC matrix into one model input (without the batch axis)."""
+        return self.features.fix_length(mfcc).reshape(self.n_mfcc, self.max_time_steps, 1)
+
+    def predict_mfcc(self, mfcc):
+        """Scream probability for an (n_mfcc, frames) MFCC matrix."""
+        return float(self.model.predict(self.model_input(mfcc)[np.newaxis])[0])
+
+    def is_scream(self, probability):
+        return probability > self.threshold
+
     def analyze_audio(self, audio_file):
         try:
             y, sr = librosa.load(audio_file, sr=self.sample_rate)
-            # Normalize audio to improve detection
-            y = y / np.max(np.abs(y)) if np.max(np.abs(y)) > 0 else y
-            print(f"Loaded audio: duration={len(y)/sr:.2f}s, sample_rate={sr}, max_amplitude={np.max(np.abs(y)):.2f}")
-            mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=self.n_mfcc)
-            print(f"MFCC shape before reshape: {mfcc.shape}")
-            if mfcc.shape[1] < self.max_time_steps:
-                mfcc = np.pad(mfcc, ((0, 0), (0, self.max_time_steps - mfcc.shape[1])), mode='constant')
+        except Exception as e:
+            print(f"Error analyzing audio {audio_file}: {e}")
+            return False
+        return self.analyze_samples(y, sr, source=audio_file)
+
+    def analyze_samples(self, samples, sr, source="<memory>"):
+        """Classify in-memory audio: int16 frames straight from PyAudio or float samples in [-1, 1]."""
+        try:
+            y = np.asarray(samples)
+            if y.dtype.kind in 'iu':
+                y = y.astype(np.float32) / np.iinfo(y.dtype).max
             else:
-                mfcc = mfcc[:, :self.max_time_steps]
-            mfcc = mfcc.reshape(1, self.n_mfcc, self.max_time_steps, 1)
-            print(f"MFCC input shape to model: {mfcc.shape}")
-            prediction = self.model.predict(mfcc, verbose=0)
-            is_scream = prediction[0][0] > 0.0 #0.3 # Lowered to 0.2 for smaller screams
+                y = y.astype(np.float32, copy=False)
+            if sr != self.sample_rate:
+                y = librosa.resample(y, orig_sr=sr, target_sr=self.sample_rate)
+                sr = self.sample_rate
+            print(f"Loaded audio: duration={len(y)/sr:.2f}s, sample_rate={sr}, max_amplitude={np.max(np.abs(y)) if y.size else 0:.2f}")
+            # The extractor peak-normalizes the clip, as in training
+            mfcc = self.features.mfcc(y)
+            print(f"MFCC shape before reshape: {mfcc.shape}")
+            probability = self.predict_mfcc(mfcc)
+            is_scream = self.is_scream(probability)
             # Log prediction for threshold tuning
             with open("scream_detection_log.txt", "a") as log_file:
-                log_file.write(f"File: {audio_file}, Probability: {prediction[0][0]:.4f}, Scream: {is_scream}\n")
-            print(f"Audio analysis: scream probability={prediction[0][0]:.4f}, is_scream={is_scream}")
+                log_file.write(f"File: {source}, Probability: {probability:.4f}, Scream: {is_scream}\n")
+            print(f"Audio analysis: scream probability={probability:.4f}, is_scream={is_scream}")
             return is_scream
         except Exception as e:
-            print(f"Error analyzing audio {audio_file}: {e}")
+            print(f"Error analyzing audio {source}: {e}")
             return False
 
 if __name__ == '__main__':
@@ -47,4 +81,4 @@ if __name__ == '__main__':
             result = detector.analyze_audio(audio_file)
             print(f"File: {audio_file}, Scream Detected: {result}")
         except FileNotFoundError:
-            print(f"File not found: {audio_file}")
\ No newline at end of file
+            print(f"File not found: {audio_file}")
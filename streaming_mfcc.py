@@ -0,0 +1,57 @@
+import numpy as np
+from backend.feature_extractor import MFCCExtractor
+from backend.ring_buffer import RingBuffer
+
+class StreamingMFCC:
+    """Incremental MFCC front end for continuous detection.
+
+    Audio is pushed chunk by chunk; each complete STFT frame is turned into a
+    mel power frame once and kept in a ring. Scoring a window only costs the
+    log/DCT over frames already computed, using the same MFCCExtractor as the
+    offline path, so windows score like the recordings the model saw.
+    """
+
+    def __init__(self, extractor=None, max_seconds=10):
+        self.extractor = extractor or MFCCExtractor()
+        self.sr = self.extractor.sr
+        self.n_fft = self.extractor.n_fft
+        self.hop_length = self.extractor.hop_length
+        capacity = int(max_seconds * self.sr / self.hop_length) + 1
+        self.mel_frames = RingBuffer(capacity, (self.extractor.mel_basis.shape[0],), np.float32)
+        self.frame_peaks = RingBuffer(capacity, (), np.float32)
+        self.reset()
+
+    def reset(self):
+        # Seed with n_fft // 2 zeros, like the centred STFT padding
+        self.pending = np.zeros(self.n_fft // 2, dtype=np.float32)
+        self.mel_frames.clear()
+        self.frame_peaks.clear()
+
+    @property
+    def frames_available(self):
+        return len(self.mel_frames)
+
+    def frames_for_seconds(self, seconds):
+        return self.extractor.frames_for_samples(int(seconds * self.sr))
+
+    def push(self, samples):
+        """Consume a chunk of audio and return the number of new frames."""
+        samples = np.asarray(samples)
+        if samples.dtype.kind in 'iu':
+            samples = samples.astype(np.float32) / np.iinfo(samples.dtype).max
+        buf = np.concatenate((self.pending, samples.astype(np.float32, copy=False)))
+        n_frames = 0 if len(buf) < self.n_fft else 1 + (len(buf) - self.n_fft) // self.hop_length
+        if n_frames:
+            frames = np.lib.stride_tricks.sliding_window_view(buf, self.n_fft)[::self.hop_length][:n_frames]
+            self.mel_frames.write(self.extractor.mel_power(frames))
+            # Peak of the samples each frame advanced over, for window normalisation
+            hops = buf[self.n_fft // 2:self.n_fft // 2 + n_frames * self.hop_length]
+            self.frame_peaks.write(np.abs(hops).reshape(n_frames, self.hop_length).max(axis=1))
+        self.pending = buf[n_frames * self.hop_length:]
+        return n_frames
+
+    def window_mfcc(self, n_frames):
+        """MFCC matrix of shape (n_mfcc, n_frames) over the newest frames."""
+        mel = self.mel_frames.latest(n_frames)
+        peak = float(self.frame_peaks.latest(n_frames).max()) if self.extractor.normalize and n_frames else 1.0
+        return self.extractor.mfcc_from_mel(mel, peak)
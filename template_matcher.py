@@ -0,0 +1,137 @@
+import threading
+import time
+import numpy as np
+from backend.audio_archive import read_wav
+from backend.keyword_spotter import kws_extractor, frame_features, phrase_span, user_recordings
+
+# Where the threshold sits between the user's own repetitions (0) and the reversed phrase (1)
+THRESHOLD_POSITION = 0.5
+BAND_FRACTION = 0.2  # Sakoe-Chiba band half-width, as a share of the template length
+
+def dtw_distances(query, templates, lengths, band_fraction=BAND_FRACTION):
+    """Length-normalised DTW distance from one query (Tq, d) to K zero-padded templates (K, T, d).
+
+    Paths advance one query frame per step and 0, 1 or 2 template frames,
+    so each query frame is a single vectorised update across all templates,
+    and cells outside a Sakoe-Chiba band around each template's diagonal are
+    never reachable.
+    """
+    K, T, _ = templates.shape
+    Tq = len(query)
+    lengths = np.asarray(lengths)
+    # Euclidean frame distances for every template at once: |q|^2 + |t|^2 - 2 q.t
+    cross = np.einsum('id,kjd->kij', query, templates)
+    cost = (query ** 2).sum(axis=1)[np.newaxis, :, np.newaxis] + (templates ** 2).sum(axis=2)[:, np.newaxis, :]
+    cost = np.sqrt(np.maximum(cost - 2 * cross, 0))
+    rows = np.arange(Tq)[np.newaxis, :, np.newaxis]
+    cols = np.arange(T)[np.newaxis, np.newaxis, :]
+    diagonal = rows * (lengths[:, np.newaxis, np.newaxis] - 1) / max(Tq - 1, 1)
+    band = np.maximum(1, band_fraction * lengths)[:, np.newaxis, np.newaxis]
+    cost = np.where((np.abs(cols - diagonal) <= band) & (cols < lengths[:, np.newaxis, np.newaxis]), cost, np.inf)
+    # Two leading inf columns stand in for j-1 and j-2 at the left edge
+    acc = np.full((K, T + 2), np.inf)
+    acc[:, 2] = cost[:, 0, 0]
+    for i in range(1, Tq):
+        best = np.minimum(np.minimum(acc[:, 2:], acc[:, 1:-1]), acc[:, :-2])
+        acc[:, 2:] = cost[:, i] + best
+    return acc[np.arange(K), lengths + 1] / (Tq + lengths)
+
+
+class TemplateMatcher:
+    """Matches live audio against the user's own recordings of their trigger phrase.
+
+    Each VoiceScreen recording is trimmed to its speech and kept as a
+    mean-normalised MFCC template (c0 dropped, so loudness doesn't matter).
+    A query is scored against all templates in one vectorised DTW pass. The
+    acceptance threshold comes from how far apart the user's own recordings
+    are, so a close enough match needs no further confirmation.
+    """
+
+    def __init__(self, recordings, sources=()):
+        self.extractor = kws_extractor()
+        self.sources = list(sources)
+        templates = []
+        for path in recordings:
+            samples, rate = read_wav(path)
+            if rate != self.extractor.sr:
+                print(f"Skipping template {path}: recorded at {rate} Hz, expected {self.extractor.sr}")
+                continue
+            templates.append(self.features(samples))
+        if not templates:
+            raise ValueError("No usable command recordings for templates")
+        self.lengths = np.array([len(t) for t in templates])
+        self.templates = np.zeros((len(templates), self.lengths.max(), templates[0].shape[1]), dtype=np.float32)
+        for k, template in enumerate(templates):
+            self.templates[k, :len(template)] = template
+        self.max_seconds = self.lengths.max() * self.extractor.hop_length / self.extractor.sr
+        self.threshold = self._calibrate()
+        self.stats = {'queries': 0, 'matches': 0, 'dtw_ms': 0.0}
+        print(f"Template matcher: {len(templates)} templates, threshold {self.threshold:.3f}")
+
+    def features(self, samples):
+        """Mean-normalised MFCCs (frames, n_mfcc - 1) of the speech in a clip."""
+        samples = np.asarray(samples)
+        if samples.dtype.kind in 'iu':
+            samples = samples.astype(np.float32) / np.iinfo(samples.dtype).max
+        mel, peaks = frame_features(self.extractor, samples)
+        start, end = phrase_span(mel)
+        mfcc = self.extractor.mfcc_from_mel(mel[start:end], peaks[start:end].max()).T[:, 1:]
+        return (mfcc - mfcc.mean(axis=0)).astype(np.float32)
+
+    def _calibrate(self):
+        """Threshold between how far apart the user's recordings are and how far their reversal is.
+
+        The reversed phrase has the same voice and spectrum but not the
+        phrase, so it stands in for the impostor audio we have no recordings of.
+        """
+        genuine, impostor = 0.0, np.inf
+        for k, length in enumerate(self.lengths):
+            template = self.templates[k, :length]
+            others = [j for j in range(len(self.lengths)) if j != k]
+            if others:
+                distances = dtw_distances(template, self.templates[others], self.lengths[others])
+                if np.isfinite(distances).any():
+                    genuine = max(genuine, float(distances.min()))
+            impostor = min(impostor, float(dtw_distances(template[::-1], self.templates, self.lengths).min()))
+        if not np.isfinite(impostor):
+            impostor = 2 * genuine
+        return genuine + THRESHOLD_POSITION * (impostor - genuine)
+
+    def distance(self, samples):
+        """Distance from the speech in `samples` to the closest template (inf if none is reachable)."""
+        started = time.perf_counter()
+        query = self.features(samples)
+        best = float(dtw_distances(query, self.templates, self.lengths).min())
+        self.stats['queries'] += 1
+        self.stats['dtw_ms'] += (time.perf_counter() - started) * 1000
+        return best
+
+    def matches(self, samples):
+        best = self.distance(samples)
+        matched = best <= self.threshold
+        if matched:
+            self.stats['matches'] += 1
+        print(f"Template match: distance={best:.3f}, threshold={self.threshold:.3f}, matched={matched}")
+        return matched
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+def load_templates(db, user_id):
+    """Cached TemplateMatcher for the user, rebuilt when their recordings change; None if they have none."""
+    recordings, sources = user_recordings(db, user_id)
+    with _matchers_lock:
+        matcher = _matchers.get(user_id)
+        if matcher is not None and matcher.sources == sources:
+            return matcher
+    if not recordings:
+        return None
+    try:
+        matcher = TemplateMatcher(recordings, sources)
+    except Exception as e:
+        print(f"Error building command templates for user_id {user_id}: {e}")
+        return None
+    with _matchers_lock:
+        _matchers[user_id] = matcher
+    return matcher
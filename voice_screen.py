@@ -5,7 +5,10 @@ from kivy.uix.textinput import TextInput
 from kivy.uix.label import Label
 import pyaudio
 import wave
+import threading
 import soundfile as sf
+from backend.audio_hub import get_audio_hub
+from backend.command_detector import prepare_command_models
 from kivy.utils import get_color_from_hex
 
 class VoiceScreen(Screen):
@@ -103,23 +106,20 @@ class VoiceScreen(Screen):
 
             self.status_label.text = "Recording..."
             print("Starting recording...")
-            p = pyaudio.PyAudio()
-            stream = p.open(format=FORMAT, channels=CHANNELS, rate=RATE,
-                            input=True, frames_per_buffer=CHUNK)
-
+            # Record from the shared microphone stream rather than opening the device again
+            hub = get_audio_hub()
             frames = []
-            for _ in range(0, int(RATE / CHUNK * RECORD_SECONDS)):
-                data = stream.read(CHUNK)
-                frames.append(data)
-
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
+            with hub.subscribe('enrollment') as recorder:
+                for _ in range(0, int(RATE / CHUNK * RECORD_SECONDS)):
+                    data = recorder.read(CHUNK)
+                    if data is None:
+                        raise RuntimeError("Microphone stopped delivering audio")
+                    frames.append(data.tobytes())
 
             filename = f"data/recording_{self.user_id}_{len(self.recordings)}.wav"
             wf = wave.open(filename, 'wb')
             wf.setnchannels(CHANNELS)
-            wf.setsampwidth(p.get_sample_size(FORMAT))
+            wf.setsampwidth(pyaudio.get_sample_size(FORMAT))
             wf.setframerate(RATE)
             wf.writeframes(b''.join(frames))
             wf.close()
@@ -160,6 +160,8 @@ class VoiceScreen(Screen):
 
     def next_screen(self, instance):
         if len(self.recordings) >= 1:
+            # Enrollment is done: train the keyword model now, not when listening starts
+            threading.Thread(target=prepare_command_models, args=(self.db, self.user_id), daemon=True).start()
             self.manager.current = 'guardian'
             self.manager.get_screen('guardian').user_id = self.user_id
             print("Transitioning to GuardianScreen")